@@ -0,0 +1 @@
+from .worlds import World, ball_world, rooms_world, graph_world
@@ -0,0 +1,145 @@
+'''
+Run the benchmarks, or compare two sets of results.
+
+    python -m benchmarks run --sizes small medium -o results.json
+    python -m benchmarks compare old.json new.json
+'''
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+
+from .measure import MEASUREMENTS
+from .worlds import WORLDS
+
+# World parameters for each size
+SIZES = {
+    "ball": {"small": {"characters": 10, "rooms": 3},
+             "medium": {"characters": 100, "rooms": 10},
+             "large": {"characters": 500, "rooms": 30}},
+    "rooms": {"small": {"rooms": 3, "people": 2, "objects": 2},
+              "medium": {"rooms": 20, "people": 20, "objects": 40},
+              "large": {"rooms": 100, "people": 100, "objects": 200}},
+    "graph": {"small": {"people": 50, "degree": 10},
+              "medium": {"people": 200, "degree": 10},
+              "large": {"people": 1000, "degree": 20}},
+}
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"],
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _parse_option(text):
+    ''' Parse a NAME=VALUE model option, with VALUE as JSON if possible.
+    '''
+    name, _, value = text.partition("=")
+    try:
+        value = json.loads(value)
+    except json.JSONDecodeError:
+        pass
+    return name, value
+
+
+def run(args):
+    options = dict(_parse_option(option) for option in args.option)
+    results = []
+    for world_name in args.worlds:
+        for size in args.sizes:
+            params = SIZES[world_name][size]
+            world = WORLDS[world_name](**params)
+            for name in args.benchmarks:
+                for result in MEASUREMENTS[name](world, args.steps,
+                                                 **options):
+                    result.update(world=world_name, size=size, params=params,
+                                  options=options, steps=args.steps)
+                    results.append(result)
+                    print(f"{world_name:6} {size:7} {result['benchmark']:20}"
+                          f" {result['metric']:22} {result['value']:12.4f} "
+                          f"{result['unit']}", file=sys.stderr)
+    output = {"meta": {"commit": _commit(), "time": time.time(),
+                       "python": platform.python_version(),
+                       "platform": platform.platform(),
+                       "steps": args.steps},
+              "results": results}
+    if args.output == "-":
+        json.dump(output, sys.stdout, indent=1)
+    else:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=1)
+
+
+def _key(result):
+    return (result["world"], json.dumps(result["params"], sort_keys=True),
+            json.dumps(result["options"], sort_keys=True), result["steps"],
+            result["benchmark"], result["metric"])
+
+
+def compare(args):
+    with open(args.old) as f:
+        old = {_key(result): result for result in json.load(f)["results"]}
+    with open(args.new) as f:
+        new = json.load(f)["results"]
+    regressions = 0
+    for result in new:
+        before = old.get(_key(result))
+        if before is None or not before["value"]:
+            continue
+        ratio = result["value"] / before["value"]
+        worse = ratio < 1 if result["better"] == "higher" else ratio > 1
+        flag = ""
+        if worse and abs(ratio - 1) > args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{result['world']:6} {result['size']:7} "
+              f"{result['benchmark']:20} {result['metric']:22} "
+              f"{before['value']:12.4f} -> {result['value']:12.4f} "
+              f"({ratio:.2f}x){flag}")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--worlds", nargs="+", choices=list(WORLDS),
+                            default=list(WORLDS))
+    run_parser.add_argument("--sizes", nargs="+",
+                            choices=["small", "medium", "large"],
+                            default=["small", "medium"])
+    run_parser.add_argument("--benchmarks", nargs="+",
+                            choices=list(MEASUREMENTS),
+                            default=list(MEASUREMENTS))
+    run_parser.add_argument("--steps", type=int, default=200,
+                            help="model steps per benchmark")
+    run_parser.add_argument("--option", action="append", default=[],
+                            metavar="NAME=VALUE",
+                            help="SmewModel option, e.g. incremental=true")
+    run_parser.add_argument("-o", "--output", default="-",
+                            help="JSON file to write (default: stdout)")
+
+    compare_parser = commands.add_parser(
+        "compare", help="compare two result files; exits with status 1 if "
+                        "anything got worse by more than the threshold")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=0.1,
+                                help="relative change to flag (default 0.1)")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        return run(args)
+    return compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
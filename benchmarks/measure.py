@@ -0,0 +1,126 @@
+'''
+Benchmarks of the main SmewModel operations on a World.
+
+Each function returns a list of result dictionaries with the keys "benchmark",
+"metric", "value", "unit" and "better" ("higher" or "lower").
+'''
+
+from time import perf_counter
+import tracemalloc
+
+from smew import SmewModel
+
+
+def _result(benchmark, metric, value, unit, better):
+    return {"benchmark": benchmark, "metric": metric, "value": value,
+            "unit": unit, "better": better}
+
+
+def percentile(values, q):
+    ''' The q-th percentile (0-100) of a list of numbers, by linear
+    interpolation.
+    '''
+    values = sorted(values)
+    if not values:
+        return float("nan")
+    position = (len(values) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def measure_advance(world, steps=200, **options):
+    ''' Steps per second and per-step latency of `advance`.
+    '''
+    model = world.model(**options)
+    latencies = []
+    for _ in range(steps):
+        start = perf_counter()
+        model.advance()
+        latencies.append(perf_counter() - start)
+        if model.ended:
+            break
+    total = sum(latencies)
+    return [_result("advance", "steps_per_second", len(latencies) / total,
+                    "1/s", "higher")] + \
+        [_result("advance", f"latency_p{q}", percentile(latencies, q) * 1000,
+                 "ms", "lower") for q in (50, 90, 99)]
+
+
+def measure_generate(world, steps=200, **options):
+    ''' Steps per second of `generate`, storing states.
+    '''
+    model = world.model(**options)
+    start = perf_counter()
+    model.generate(steps)
+    elapsed = perf_counter() - start
+    return [_result("generate", "steps_per_second",
+                    max(model.step, 1) / elapsed, "1/s", "higher")]
+
+
+def measure_possible_events(world, steps=20, repeats=5, **options):
+    ''' Time to list every possible event, after running a few steps.
+    '''
+    model = world.model(**options)
+    model.generate(steps, store_states=False)
+    times = []
+    for _ in range(repeats):
+        start = perf_counter()
+        events = model.get_possible_events()
+        times.append(perf_counter() - start)
+    return [_result("get_possible_events", "seconds", min(times), "s",
+                    "lower"),
+            _result("get_possible_events", "events", len(events), "",
+                    "higher")]
+
+
+def measure_narration(world, steps=200, **options):
+    ''' Narration throughput, from the time spent in `narrate`.
+    '''
+    model = world.model(**options)
+    profiler = model.start_profiling()
+    model.generate(steps, store_states=False)
+    seconds = sum(stats.time["narrate"]
+                  for stats in profiler.events.values())
+    narrations = len(model.event_log.fragments)
+    return [_result("narrate", "narrations_per_second",
+                    narrations / seconds if seconds else float("nan"), "1/s",
+                    "higher")]
+
+
+def measure_states(world, steps=50, repeats=5, **options):
+    ''' Time to save the state of a model and build one from it.
+    '''
+    model = world.model(**options)
+    model.generate(steps, store_states=False)
+    to_state = []
+    from_state = []
+    for _ in range(repeats):
+        start = perf_counter()
+        state = model.to_state()
+        to_state.append(perf_counter() - start)
+        start = perf_counter()
+        SmewModel.from_state(state, world.events, world.grammar,
+                             verbose=False)
+        from_state.append(perf_counter() - start)
+    return [_result("to_state", "seconds", min(to_state), "s", "lower"),
+            _result("from_state", "seconds", min(from_state), "s", "lower")]
+
+
+def measure_memory(world, steps=200, **options):
+    ''' Peak memory allocated while building and running a model.
+    '''
+    tracemalloc.start()
+    try:
+        model = world.model(**options)
+        model.generate(steps)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return [_result("generate", "peak_memory", peak / 2**20, "MiB", "lower")]
+
+
+MEASUREMENTS = {"advance": measure_advance, "generate": measure_generate,
+                "get_possible_events": measure_possible_events,
+                "narrate": measure_narration, "states": measure_states,
+                "memory": measure_memory}
@@ -0,0 +1,269 @@
+'''
+Synthetic worlds of any size, for benchmarking.
+
+Each generator returns a World: a starting model state, a list of Event
+classes and a grammar, which can be turned into a model with `World.model`.
+'''
+
+from collections import namedtuple
+import random
+
+from smew import Actor, Event, SmewModel
+
+
+class World(namedtuple("World", ["name", "params", "state", "events",
+                                 "grammar"])):
+    ''' Everything needed to build a benchmark model.
+    '''
+    __slots__ = ()
+
+    def model(self, **options):
+        ''' Create a new model of this world.
+
+        Args:
+            **options: SmewModel keyword arguments; the model isn't verbose
+                       and has a fixed seed unless they say otherwise.
+        '''
+        options.setdefault("verbose", False)
+        options.setdefault("seed", 0)
+        return SmewModel.from_state(self.state, self.events, self.grammar,
+                                    **options)
+
+
+# Ball world: characters wandering between rooms and noticing each other
+# -------------------------------------------------------------------
+class BallArrive(Event):
+    match = ["character"]
+    narrative = ["{a} arrives at the ball.", "At last, {a} has arrived."]
+
+    def filter(self, a):
+        return a.location == "home"
+
+    def action(self, a):
+        a.location = "room 0"
+        self.narrate(a=a)
+
+
+class BallMove(Event):
+    match = ["character", "room"]
+    narrative = ["{a} goes to the {room}.", "{a} follows the crowd to the {room}."]
+
+    def filter_prefix(self, a):
+        return a.location != "home"
+
+    def filter(self, a, room):
+        return a.location != "home" and a.location != room.name
+
+    def action(self, a, room):
+        a.location = room.name
+        self.narrate(a=a, room=room)
+
+
+class BallNotice(Event):
+    match = ["character", "character"]
+    same = {"location": (0, 1)}
+    narrative = {"origin": ["{a} notices {b} #across#."],
+                 "across": ["across the room", "by the window", "nearby"]}
+
+    def filter_prefix(self, a):
+        return a.location != "home"
+
+    def filter(self, a, b):
+        return (a.location != "home" and
+                not self.get_related(a, "noticed", b))
+
+    def vector_filter(self, a, b):
+        return (a.location != "home") & ~self.related_mask(a, "noticed", b)
+
+    def action(self, a, b):
+        self.relate(a, "noticed", b, False)
+        self.narrate(a=a, b=b)
+        if self.rng.random() < 0.2:
+            self.get_event("BallFallInLove")(self.model, a, b).run()
+
+
+class BallFallInLove(Event):
+    trigger_only = True
+    narrative = ["Suddenly, {a} realizes how #adjective# {b} looks tonight."]
+
+    def filter(self, a, b):
+        return True
+
+    def action(self, a, b):
+        self.relate(a, "loves", b, False)
+        self.narrate(a=a, b=b)
+
+
+class BallTalk(Event):
+    match = ["character", "character"]
+    same = {"location": (0, 1)}
+    narrative = ["{a} and {b} talk about {topic}."]
+
+    def filter_prefix(self, a):
+        return a.location != "home"
+
+    def filter(self, a, b):
+        return (a.location != "home" and
+                bool(self.get_related(a, "noticed", b)))
+
+    def vector_filter(self, a, b):
+        return (a.location != "home") & self.related_mask(a, "noticed", b)
+
+    def action(self, a, b):
+        self.narrate(a=a, b=b,
+                     topic=self.rng.choice(["the music", "the weather",
+                                            "the other guests"]))
+
+
+def ball_world(characters=10, rooms=3, seed=0):
+    ''' A world like the ball model: characters arrive, move between rooms,
+    notice each other, fall in love, and talk.
+    '''
+    actors = [Actor(f"guest {i}", "character", {"location": "home"})
+              for i in range(characters)]
+    actors += [Actor(f"room {i}", "room") for i in range(rooms)]
+    state = SmewModel(actors, verbose=False, seed=seed).to_state()
+    grammar = {"adjective": ["beautiful", "charming", "elegant", "witty"]}
+    return World("ball", {"characters": characters, "rooms": rooms}, state,
+                 [BallArrive, BallMove, BallNotice, BallFallInLove, BallTalk],
+                 grammar)
+
+
+# Rooms world: people carrying objects between connected rooms
+# -------------------------------------------------------------------
+class RoomsTake(Event):
+    match = ["person", "object"]
+    same = {"location": (0, 1)}
+    narrative = ["{a} picks up the {b}."]
+
+    def filter(self, a, b):
+        return not a.carrying
+
+    def vector_filter(self, a, b):
+        return a.carrying == None  # noqa: E711 (elementwise comparison)
+
+    def action(self, a, b):
+        a.carrying = b.name
+        b.location = None
+        self.narrate(a=a, b=b)
+
+
+class RoomsDrop(Event):
+    match = ["person"]
+    narrative = ["{a} puts down the {thing}."]
+
+    def filter(self, a):
+        return bool(a.carrying)
+
+    def action(self, a):
+        thing = self.get_actor(a.carrying)
+        thing.location = a.location
+        a.carrying = None
+        self.narrate(a=a, thing=thing)
+
+
+class RoomsMove(Event):
+    match = ["person"]
+    narrative = ["{a} walks into the {room}.", "{a} heads for the {room}."]
+
+    def filter(self, a):
+        return True
+
+    def action(self, a):
+        here = self.get_actor(a.location)
+        room = self.rng.choice(self.get_related(here, "connects to"))
+        a.location = room.name
+        self.narrate(a=a, room=room)
+
+
+class RoomsTalk(Event):
+    match = ["person", "person"]
+    same = {"location": (0, 1)}
+    narrative = ["{a} chats with {b}.", "{a} and {b} gossip for a while."]
+
+    def filter(self, a, b):
+        return True
+
+    def action(self, a, b):
+        self.narrate(a=a, b=b)
+
+
+def rooms_world(rooms=3, people=2, objects=2, seed=0):
+    ''' A world like example_4: people move between a ring of connected
+    rooms, and pick up and put down objects.
+    '''
+    rng = random.Random(seed)
+    room_actors = [Actor(f"room {i}", "room") for i in range(rooms)]
+    actors = list(room_actors)
+    actors += [Actor(f"person {i}", "person",
+                     {"location": rng.choice(room_actors).name,
+                      "carrying": None})
+               for i in range(people)]
+    actors += [Actor(f"object {i}", "object",
+                     {"location": rng.choice(room_actors).name})
+               for i in range(objects)]
+    model = SmewModel(actors, verbose=False, seed=seed)
+    for i, room in enumerate(room_actors):
+        model.relate(room, "connects to", room_actors[(i + 1) % rooms])
+    return World("rooms", {"rooms": rooms, "people": people,
+                           "objects": objects},
+                 model.to_state(), [RoomsTake, RoomsDrop, RoomsMove,
+                                    RoomsTalk], {})
+
+
+# Graph world: a dense web of relationships that changes over time
+# -------------------------------------------------------------------
+class GraphBefriend(Event):
+    match = ["person", "person"]
+    narrative = ["{a} becomes friends with {b}."]
+
+    def filter_prefix(self, a):
+        return a.mood > 0
+
+    def filter(self, a, b):
+        return a.mood > 0 and not self.get_related(a, "friend", b)
+
+    def vector_filter(self, a, b):
+        return (a.mood > 0) & ~self.related_mask(a, "friend", b)
+
+    def action(self, a, b):
+        self.relate(a, "friend", b)
+        a.mood -= 1
+        self.narrate(a=a, b=b)
+
+
+class GraphFallOut(Event):
+    match = ["person", "person"]
+    narrative = ["{a} and {b} aren't friends any more."]
+
+    def filter_prefix(self, a):
+        return a.mood <= 0
+
+    def filter(self, a, b):
+        return a.mood <= 0 and bool(self.get_related(a, "friend", b))
+
+    def vector_filter(self, a, b):
+        return (a.mood <= 0) & self.related_mask(a, "friend", b)
+
+    def action(self, a, b):
+        self.unrelate(a, "friend", b)
+        a.mood += 2
+        self.narrate(a=a, b=b)
+
+
+def graph_world(people=50, degree=10, seed=0):
+    ''' A world of people with `degree` random friends each on average, who
+    make and break friendships.
+    '''
+    rng = random.Random(seed)
+    actors = [Actor(f"person {i}", "person", {"mood": rng.randint(-2, 2)})
+              for i in range(people)]
+    model = SmewModel(actors, verbose=False, seed=seed)
+    for _ in range(people * degree // 2):
+        a, b = rng.sample(actors, 2)
+        model.relate(a, "friend", b)
+    return World("graph", {"people": people, "degree": degree},
+                 model.to_state(), [GraphBefriend, GraphFallOut], {})
+
+
+WORLDS = {"ball": ball_world, "rooms": rooms_world, "graph": graph_world}
@@ -5,7 +5,6 @@ A work in progress about several characters at a vaguely Victorian ball.
 They dance, wander around, fall in and out of love, and become jealous.
 '''
 
-import random
 from smew import Event, Actor, SmewModel
 
 # Events
@@ -48,6 +47,9 @@ class Move(Event):
         "'I'm going to the {end},', {a} announces."
     ]
 
+    def filter_prefix(self, a):
+        return a.location != "home"
+
     def filter(self, a, b):
         return a.location != "home" and a.location != b.name
     
@@ -58,14 +60,17 @@ class Move(Event):
 
 class Notice(Event):
     match = ["character", "character"]
+    same = {"location": (0, 1)}
     narrative = [
         "{a} notices {b} across the room.",
         "{b} accidentally brushes against {a}.",
         "{a} turns and sees {b} standing right there."
     ]
+    def filter_prefix(self, a):
+        return a.location != "home"
+
     def filter(self, a, b):
         return (a.location != "home" and
-                a.location == b.location and
                 not self.get_related(a, "loves", b))
     
     def action(self, a, b):
@@ -75,6 +80,7 @@ class Notice(Event):
 
 class FallInLove(Event):
     match = ["character", "character"]
+    trigger_only = True
 
     narrative = [
         "{a} is smitten with {b}.",
@@ -107,12 +113,13 @@ class DanceWithNPC(Event):
         return a.location=="main hall"
 
     def action(self, a):
-        adjective = random.choice(["old", "young", "elegant", "handsome", "striking"])
-        noun = random.choice(["debutante", "cavalry offier", "knight", "duchess", "matron"])
+        adjective = self.rng.choice(["old", "young", "elegant", "handsome", "striking"])
+        noun = self.rng.choice(["debutante", "cavalry offier", "knight", "duchess", "matron"])
         self.narrate(name=a, partner=f"{adjective} {noun}")
 
 class AskToDance(Event):
     match = ["character", "character"]
+    same = {"location": (0, 1)}
     narrative = {
         "asks": [ "{a} works up the courage and asks {b} for a dance.",
                  "'May I have the next dance?' {a} asks {b}."
@@ -123,9 +130,12 @@ class AskToDance(Event):
         "{a} and {b} step onto the floor and dance together."]
     }
 
+    def filter_prefix(self, a):
+        return a.location == "main hall"
+
     def filter(self, a, b):
         return (self.get_related(a, "loves", b) and
-                a.location == "main hall" and a.location == b.location)
+                a.location == "main hall")
     
     def action(self, a, b):
         self.narrate(_origin="asks", a=a, b=b)
@@ -139,7 +149,7 @@ class AskToDance(Event):
                                .format(b=b))
         self.narrate(_origin="dances", a=a, b=b)
         # B might fall in love with A
-        if not self.get_related(b, "loves", a) and random.random() < 0.5:
+        if not self.get_related(b, "loves", a) and self.rng.random() < 0.5:
             event = FallInLove(self.model, b, a)
             event.run()
         # If anyone else present loves B, they get jealous of A
@@ -153,21 +163,25 @@ class AskToDance(Event):
 
 class TalkQuietly(Event):
     match = ["character", "character"]
+    same = {"location": (0, 1)}
     narrative = [
         "{a} sits by {b}, and they talk quiety.",
         "{a} engages {b} in conversation.",
         "{a} and {b} converse on a setee in the salon."
     ]
 
+    def filter_prefix(self, a):
+        return a.location == "salon"
+
     def filter(self, a, b):
-        return (a.location == "salon" and b.location == "salon")
+        return a.location == "salon"
     
     def action(self, a, b):
         self.narrate(a=a, b=b)
         a_loves = self.get_related(a, "loves")
-        if len(a_loves) > 0 and random.random() < 0.5:
-            crush = random.choice(a_loves)
-            adjective = random.choice(["beauty", "wit", "charm", "elegance"])
+        if len(a_loves) > 0 and self.rng.random() < 0.5:
+            crush = self.rng.choice(a_loves)
+            adjective = self.rng.choice(["beauty", "wit", "charm", "elegance"])
             _text = f"{a} can't help but mention {crush}'s {adjective}."
             self.narrate(_text=_text)
             if (self.get_related(b, "loves", crush) and 
@@ -177,6 +191,7 @@ class TalkQuietly(Event):
 
 class GetJealous(Event):
     match = []
+    trigger_only = True
 
     def filter(self, a, b):
         return False  # Only callable from other events
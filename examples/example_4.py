@@ -4,7 +4,6 @@ https://github.com/aparrish/seaduck/blob/master/examples/04_rooms_and_objects.js
 
 '''
 
-import random
 from smew import Actor, Event, SmewModel
 
 room_names = ["kitchen", "living room", "study"]
@@ -20,11 +19,12 @@ drinks = [Actor(name, "drink", {"location": None})
 
 class Take(Event):
     match = ["person", "drink"]
+    same = {"location": (0, 1)}
     narrative = ["{a} took the {b}.", 
                  "'Oh hey, {b}!' said {a}, and picked it up."]
 
     def filter(self, a, b):
-        return a.location == b.location and not a.has_drink
+        return not a.has_drink
     
     def action(self, a, b):
         a.has_drink = True
@@ -40,7 +40,7 @@ class Move(Event):
     def action(self, a):
         current = self.get_actor(a.location)
         destinations = self.get_related("connects to", current)
-        destination = random.choice(destinations)
+        destination = self.rng.choice(destinations)
         a.location = destination.name
         self.narrate(a=a, room=destination)
     
@@ -49,9 +49,10 @@ class Move(Event):
     
 class Talk(Event):
     match = ["person", "person"]
+    same = {"location": (0, 1)}
 
     def filter(self, a, b):
-        return a.location == b.location
+        return True
     
     def action(self, a, b):
         self.narrate(a=a,b=b)
@@ -89,7 +90,7 @@ class PlayGames(Event):
         return a.location == "living room"
     
     def action(self, a):
-        self.narrate(a=a, game=random.choice(self.games))
+        self.narrate(a=a, game=self.rng.choice(self.games))
     
     narrative = [
         "{a} sat down to play {game}# for a while.",
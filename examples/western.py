@@ -2,7 +2,6 @@
 # Adapted from the western domain Ware, 2014, p.17
 # https://nil.cs.uno.edu/publications/papers/ware2014thesis.pdf
 
-import random
 from smew import Event, Actor, SmewModel
 
 
@@ -42,7 +41,7 @@ class Shoot(Event):
     
     def action(self, shooter, target):
         self.narrate(_origin="shoots", shooter=shooter, target=target)
-        if random.random() < 0.5:
+        if self.rng.random() < 0.5:
             self.narrate(_origin="hit", target=target)
             target.sick = True
         else:
@@ -5,5 +5,6 @@ setup(name='Smew',
       packages=['smew'],
       author='David Masad',
       description="Narrative generation and simulation framework",
-      install_requires=["tracery"]
+      install_requires=["tracery"],
+      extras_require={"numpy": ["numpy"], "sparse": ["numpy", "scipy"]}
       )
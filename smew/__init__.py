@@ -1 +1,5 @@
-from .smew_model import Event, Actor, SmewModel
+from .smew_model import Event, Actor, SmewModel, Candidate
+from .relationships import RelationshipStore
+from .sinks import Sink, FileSink, JSONLinesSink, TextSink
+from .ensemble import EnsembleResult, run_ensemble, run_one
+from .search import SearchResult, beam_search, monte_carlo_search
@@ -0,0 +1,106 @@
+from collections import namedtuple
+import multiprocessing
+import os
+import random
+
+from .smew_model import SmewModel
+
+
+EnsembleResult = namedtuple("EnsembleResult",
+                            ["seed", "text", "events", "state"])
+EnsembleResult.__doc__ = ''' The outcome of one run in an ensemble.
+
+    seed: The seed the run was started with.
+    text: List of the narration paragraphs of every event in the run.
+    events: List of the events that happened, as strings.
+    state: The model state at the end of the run.
+'''
+
+
+def run_one(state, events, seed, grammar=None, max_steps=100, **options):
+    ''' Run one model from a starting state with a given seed.
+
+    Args:
+        state: The starting model state dictionary.
+        events: A list of Event classes.
+        seed: The random seed for the run.
+        grammar: if not None, a Tracery grammar dictionary for the model.
+        max_steps: Maximum number of steps to run the model for.
+        **options: Any other SmewModel keyword arguments.
+
+    Returns:
+        An EnsembleResult.
+    '''
+    # Seed the random module too, for any events that use it directly, but
+    # leave it as it was for the caller afterwards.
+    random_state = random.getstate()
+    random.seed(seed)
+    try:
+        model = SmewModel.from_state(state, events, grammar, verbose=False,
+                                     seed=seed, **options)
+        model.generate(max_steps, store_states=False)
+    finally:
+        random.setstate(random_state)
+    return EnsembleResult(seed,
+                          [event.text for event in model.event_log],
+                          list(model.event_history),
+                          model.to_state())
+
+
+def _run_args(args):
+    state, events, seed, grammar, max_steps, options = args
+    return run_one(state, events, seed, grammar, max_steps, **options)
+
+
+def run_ensemble(state, events, seeds, grammar=None, max_steps=100,
+                 processes=None, chunksize=None, ordered=False, **options):
+    ''' Run many independent models from the same starting state.
+
+    Each run starts from `state` and only depends on its seed (used as the
+    model's `seed`), so a given seed always produces the same story, whether
+    it is run on its own or in an ensemble, and however many worker processes
+    there are.
+
+    The Event classes must be importable by the worker processes (i.e.
+    defined at the top level of a module).
+
+    Args:
+        state: The starting model state dictionary, e.g. from
+               `model.to_state()`.
+        events: A list of Event classes.
+        seeds: An iterable of integer seeds, one per run; or an integer N to
+               use the seeds 0 to N-1.
+        grammar: if not None, a Tracery grammar dictionary for the models.
+        max_steps: Maximum number of steps to run each model for.
+        processes: Number of worker processes; defaults to the number of
+                   CPUs. If 0, the runs are done one by one in this process.
+        chunksize: How many runs to send to a worker at a time; by default,
+                   enough to give each worker about four chunks.
+        ordered: If True, yield the results in the order of the seeds, rather
+                 than as soon as each run finishes.
+        **options: Any other SmewModel keyword arguments (e.g.
+                   `incremental`).
+
+    Yields:
+        An EnsembleResult for each run.
+    '''
+    if isinstance(seeds, int):
+        seeds = range(seeds)
+    args = ((state, events, seed, grammar, max_steps, options)
+            for seed in seeds)
+    if processes == 0:
+        yield from map(_run_args, args)
+        return
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if chunksize is None:
+        try:
+            chunksize = max(1, len(seeds) // (processes * 4))
+        except TypeError:  # The seeds are a generator
+            chunksize = 1
+    with multiprocessing.Pool(processes) as pool:
+        if ordered:
+            yield from pool.imap(_run_args, args, chunksize)
+        else:
+            yield from pool.imap_unordered(_run_args, args, chunksize)
@@ -0,0 +1,28 @@
+from functools import lru_cache
+from hashlib import blake2b
+
+
+def _hash(feature):
+    digest = blake2b(repr(feature).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+# typed=True so that e.g. 1 and True, which are equal but have different
+# reprs, are cached separately.
+@lru_cache(maxsize=1 << 16, typed=True)
+def _cached_hash(*feature):
+    return _hash(feature)
+
+
+def feature_hash(*feature):
+    ''' A 64-bit hash of one feature of a model state, e.g.
+    ("tag", actor name, tag).
+
+    The state's hash is the XOR of the hashes of all its features, so it can
+    be updated as features are added and removed. The hashes are based on
+    the features' reprs, and are the same in every Python process.
+    '''
+    try:
+        return _cached_hash(*feature)
+    except TypeError:  # Unhashable property values can't be cached
+        return _hash(feature)
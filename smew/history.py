@@ -0,0 +1,164 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Sequence
+
+
+# Kinds of change recorded between states
+SET = 0  # (SET, actor name, property, value)
+TAGS = 1  # (TAGS, actor name, tag list)
+ADD_ACTOR = 2  # (ADD_ACTOR, actor state, position in the actor list)
+REMOVE_ACTOR = 3  # (REMOVE_ACTOR, actor name)
+RELATE = 4  # (RELATE, triple)
+UNRELATE = 5  # (UNRELATE, triple)
+RELATIONSHIPS = 6  # (RELATIONSHIPS, list of every triple)
+
+
+class StateHistory(Sequence):
+    ''' A sequence of model states, stored as changes between them.
+
+    Every `checkpoint_every` entries, the full state (as from
+    SmewModel.to_state) is stored; every other entry only stores the list of
+    changes made since the one before it. Indexing or iterating rebuilds the
+    full state dictionaries on demand.
+    '''
+
+    def __init__(self, checkpoint_every=100):
+        ''' Create a new, empty state history.
+
+        Args:
+            checkpoint_every: How often to store a full state.
+        '''
+        self.checkpoint_every = checkpoint_every
+        self._entries = []  # Full state dicts, or lists of changes
+        self._checkpoints = array("l")  # Indexes of the full states
+        self._steps = array("l")  # Model step each entry was recorded at
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("state history index out of range")
+        start = self._checkpoints[bisect_right(self._checkpoints, i) - 1]
+        actors, relationships = self._unpack(self._entries[start])
+        for changes in self._entries[start + 1:i + 1]:
+            self._apply(actors, relationships, changes)
+        return self._pack(actors, relationships)
+
+    def __iter__(self):
+        actors = relationships = None
+        for entry in self._entries:
+            if isinstance(entry, dict):
+                actors, relationships = self._unpack(entry)
+            else:
+                self._apply(actors, relationships, entry)
+            yield self._pack(actors, relationships)
+
+    def __repr__(self):
+        return (f"{self.__class__.__name__}({len(self)} states, "
+                f"{len(self._checkpoints)} checkpoints)")
+
+    def append(self, state, step=None):
+        ''' Add a full state to the end of the history.
+
+        Args:
+            state: A model state dictionary.
+            step: The model step the state is from, if known.
+        '''
+        self._checkpoints.append(len(self._entries))
+        self._entries.append(state)
+        self._steps.append(-1 if step is None else step)
+
+    def append_changes(self, changes, step=None):
+        ''' Add a state, described by the changes since the previous one.
+
+        Args:
+            changes: A list of change tuples.
+            step: The model step the state is from, if known.
+        '''
+        if len(self._entries) == 0:
+            raise IndexError("the first state in a history must be full")
+        self._entries.append(changes)
+        self._steps.append(-1 if step is None else step)
+
+    def needs_checkpoint(self):
+        ''' Whether the next state should be stored in full.
+        '''
+        if len(self._checkpoints) == 0:
+            return True
+        return len(self._entries) - self._checkpoints[-1] >= \
+            self.checkpoint_every
+
+    def at_step(self, step):
+        ''' The last state recorded at the given model step.
+
+        Raises:
+            KeyError if no state was recorded at that step.
+        '''
+        for i in range(len(self._steps) - 1, -1, -1):
+            if self._steps[i] == step:
+                return self[i]
+        raise KeyError(f"No state was recorded at step {step}")
+
+    def truncate(self, length):
+        ''' Remove every state after the first `length`.
+        '''
+        del self._entries[length:]
+        del self._steps[length:]
+        del self._checkpoints[bisect_left(self._checkpoints, length):]
+
+    def clear(self):
+        ''' Remove every state from the history.
+        '''
+        self.__init__(self.checkpoint_every)
+
+    @staticmethod
+    def _unpack(state):
+        ''' Copy a state dict into a form that changes can be applied to.
+        '''
+        actors = {actor["name"]: {"name": actor["name"],
+                                  "tags": list(actor["tags"]),
+                                  "properties": dict(actor["properties"])}
+                  for actor in state["Actors"]}
+        relationships = dict.fromkeys(tuple(triple) for triple
+                                      in state["Relationships"])
+        return actors, relationships
+
+    @staticmethod
+    def _pack(actors, relationships):
+        return {"Actors": [{"name": actor["name"],
+                            "tags": list(actor["tags"]),
+                            "properties": dict(actor["properties"])}
+                           for actor in actors.values()],
+                "Relationships": list(relationships)}
+
+    @staticmethod
+    def _apply(actors, relationships, changes):
+        for change in changes:
+            kind = change[0]
+            if kind == SET:
+                actors[change[1]]["properties"][change[2]] = change[3]
+            elif kind == RELATE:
+                relationships[change[1]] = None
+            elif kind == UNRELATE:
+                del relationships[change[1]]
+            elif kind == TAGS:
+                actors[change[1]]["tags"] = list(change[2])
+            elif kind == ADD_ACTOR:
+                state, position = change[1], change[2]
+                items = list(actors.items())
+                items.insert(position, (state["name"], {
+                    "name": state["name"],
+                    "tags": list(state["tags"]),
+                    "properties": dict(state["properties"])}))
+                actors.clear()
+                actors.update(items)
+            elif kind == REMOVE_ACTOR:
+                del actors[change[1]]
+            elif kind == RELATIONSHIPS:
+                relationships.clear()
+                relationships.update(dict.fromkeys(change[1]))
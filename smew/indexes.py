@@ -0,0 +1,168 @@
+class SetIndex:
+    ''' A mapping of keys to insertion-ordered sets of items, e.g. of each
+    Event class to the actor tuples it is valid for.
+
+    Like a RelationshipStore, it can have layers over it that record their
+    own changes without modifying it (see LayeredSetIndex), which is how the
+    model undoes changes to its valid events, or shares them between forks.
+    '''
+
+    depth = 0  # How many indexes this one is layered over
+
+    def __init__(self):
+        self._sets = {}  # Key -> {item: None}
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self._sets})"
+
+    def contains(self, key, item):
+        ''' Whether `item` is in the set for `key`.
+        '''
+        items = self._sets.get(key)
+        return items is not None and item in items
+
+    def members(self, key):
+        ''' The items in the set for `key`, in the order they were added, as
+        an iterable that must not be modified.
+        '''
+        return self._sets.get(key, ())
+
+    def add(self, key, item):
+        ''' Add an item to the set for `key`.
+
+        Returns:
+            True if it was added, False if it was already there.
+        '''
+        items = self._sets.get(key)
+        if items is None:
+            items = self._sets[key] = {}
+        elif item in items:
+            return False
+        items[item] = None
+        return True
+
+    def discard(self, key, item):
+        ''' Remove an item from the set for `key`, if it is there.
+        '''
+        items = self._sets.get(key)
+        if items is not None and item in items:
+            del items[item]
+            if not items:
+                del self._sets[key]
+
+    def pop(self, key):
+        ''' Empty the set for `key`.
+
+        Returns:
+            A list of the items that were in it.
+        '''
+        return list(self._sets.pop(key, ()))
+
+    def layer(self):
+        ''' A new index layered over this one (see LayeredSetIndex).
+        '''
+        return LayeredSetIndex(self)
+
+    def flattened(self):
+        ''' A new, independent index with the same sets as this one.
+        '''
+        index = SetIndex()
+        index._sets = {key: dict(items) for key, items in self._sets.items()}
+        return index
+
+    def _keys(self):
+        return dict.fromkeys(self._sets)
+
+
+class LayeredSetIndex(SetIndex):
+    ''' A SetIndex that starts out sharing another index's sets.
+
+    Items added to this index are kept in its own sets, and items of the
+    base index that are removed from this one are just marked as removed,
+    so creating a layer doesn't copy anything, and the base index is never
+    modified. The base index must not be modified afterwards either.
+    '''
+
+    def __init__(self, base):
+        super().__init__()
+        self._base = base
+        self._removed = {}  # Key -> {item of the base removed here: None}
+        self.depth = base.depth + 1
+
+    @property
+    def changed(self):
+        ''' Whether this index differs from its base index.
+        '''
+        return bool(self._sets or self._removed)
+
+    def contains(self, key, item):
+        # Look down through the layers in a loop rather than recursively,
+        # since this is called for every change to the index.
+        index = self
+        while index.depth:
+            items = index._sets.get(key)
+            if items is not None and item in items:
+                return True
+            removed = index._removed.get(key)
+            if removed is not None and item in removed:
+                return False
+            index = index._base
+        items = index._sets.get(key)
+        return items is not None and item in items
+
+    def members(self, key):
+        removed = self._removed.get(key, ())
+        own = self._sets.get(key, ())
+        if not removed and not own:
+            return self._base.members(key)
+        return [item for item in self._base.members(key)
+                if item not in removed] + list(own)
+
+    def add(self, key, item):
+        if self.contains(key, item):
+            return False
+        # An item of the base that was removed and added again stays marked
+        # as removed, so that it is ordered as if it had just been added.
+        return super().add(key, item)
+
+    def discard(self, key, item):
+        items = self._sets.get(key)
+        if items is not None and item in items:
+            super().discard(key, item)
+        elif self._base.contains(key, item):
+            self._removed.setdefault(key, {})[item] = None
+
+    def pop(self, key):
+        items = list(self.members(key))
+        for item in self._base.members(key):
+            self._removed.setdefault(key, {})[item] = None
+        self._sets.pop(key, None)
+        return items
+
+    def merge(self):
+        ''' Apply this index's changes to its base index.
+
+        Returns:
+            The base index, which then holds the same sets, in the same
+            order, as this one.
+        '''
+        for key, items in self._removed.items():
+            for item in items:
+                self._base.discard(key, item)
+        for key, items in self._sets.items():
+            for item in items:
+                self._base.add(key, item)
+        return self._base
+
+    def flattened(self):
+        index = SetIndex()
+        for key in self._keys():
+            items = dict.fromkeys(self.members(key))
+            if items:
+                index._sets[key] = items
+        return index
+
+    def _keys(self):
+        keys = self._base._keys()
+        keys.update(dict.fromkeys(self._sets))
+        return keys
@@ -0,0 +1,284 @@
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from collections.abc import Sequence
+
+from .narration import render_all
+
+
+LoggedEvent = namedtuple("LoggedEvent", ["step", "event", "actors", "text"])
+LoggedEvent.__doc__ = ''' One event from an EventLog.
+
+    step: The model step the event happened in.
+    event: The name of the Event class.
+    actors: Tuple of the names of the actors involved.
+    text: The narration text the event generated.
+'''
+
+
+class StepRecord(namedtuple("StepRecord", ["step", "events", "state"])):
+    ''' Everything that happened in one step of a model run.
+
+    step: The model step number.
+    events: List of the LoggedEvents that happened during the step (the
+            event the model chose, and any events it ran itself).
+    state: The model state after the step, or None if it wasn't requested.
+    '''
+    __slots__ = ()
+
+    def as_dict(self):
+        ''' The record as a dictionary of plain lists and strings.
+        '''
+        return {"step": self.step,
+                "events": [{"event": event.event,
+                            "actors": list(event.actors),
+                            "text": event.text} for event in self.events],
+                "state": self.state}
+
+
+class EventLog:
+    ''' A compact record of every event that has happened in a model run.
+
+    Each event that runs is stored once, as a step number, an interned event
+    class id, interned actor ids and the ids of the narration fragments it
+    generated, all in flat arrays. Each narration fragment is stored once too.
+
+    `text_history` and `event_history` present the log the way SmewModel has
+    always exposed them, as read-only sequences.
+    '''
+
+    def __init__(self):
+        self._reset()
+        self.text_history = TextHistory(self)
+        self.event_history = EventHistory(self)
+
+    def _reset(self):
+        self._event_names = []  # Interned event class names, by id
+        self._event_ids = {}
+        self._actor_names = []  # Interned actors, by id
+        self._actor_reprs = []
+        self._actor_ids = {}  # repr -> id
+
+        self.fragments = []  # Every narration fragment, in narration order
+        self._texts = {}  # Distinct fragment strings
+        self._steps = array("l")
+        self._events = array("l")
+        self._actor_offsets = array("l", [0])
+        self._actors = array("l")
+        self._fragment_offsets = array("l", [0])
+        self._event_fragments = array("l")
+        # Position of each event's paragraph in text_history
+        self._text_positions = array("l")
+        self._custom_reprs = {}  # Event index -> repr, for unusual Events
+
+    def __len__(self):
+        return len(self._steps)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("event log index out of range")
+        actors = self._actors[self._actor_offsets[i]:self._actor_offsets[i+1]]
+        return LoggedEvent(self._steps[i],
+                           self._event_names[self._events[i]],
+                           tuple(self._actor_names[a] for a in actors),
+                           self.paragraph(i))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def add_fragment(self, text):
+        ''' Store a piece of narration text.
+
+        Returns:
+            The fragment's id.
+        '''
+        if type(text) is str:
+            # Template-based narration repeats itself a lot, so keep just
+            # one copy of each distinct string.
+            text = self._texts.setdefault(text, text)
+        self.fragments.append(text)
+        return len(self.fragments) - 1
+
+    def add_event(self, step, name, actors, fragment_ids, description=None):
+        ''' Record an event that has just finished running.
+
+        Args:
+            step: The model step the event happened in.
+            name: The name of the Event class.
+            actors: The Actors involved in the event.
+            fragment_ids: Ids of the fragments the event narrated.
+            description: If not None, the string to show for this event in
+                         `event_history`, instead of the usual
+                         "EventName(Actor(...), ...)".
+        '''
+        event_id = self._event_ids.get(name)
+        if event_id is None:
+            event_id = self._event_ids[name] = len(self._event_names)
+            self._event_names.append(name)
+        for actor in actors:
+            key = repr(actor)
+            actor_id = self._actor_ids.get(key)
+            if actor_id is None:
+                actor_id = self._actor_ids[key] = len(self._actor_names)
+                self._actor_names.append(actor.name)
+                self._actor_reprs.append(key)
+            self._actors.append(actor_id)
+
+        if description is not None:
+            self._custom_reprs[len(self)] = description
+        self._text_positions.append(len(self.fragments) + len(self))
+        self._steps.append(step)
+        self._events.append(event_id)
+        self._actor_offsets.append(len(self._actors))
+        self._event_fragments.extend(fragment_ids)
+        self._fragment_offsets.append(len(self._event_fragments))
+
+    def paragraph(self, i):
+        ''' The full narration text of the i-th event.
+        '''
+        start, end = self._fragment_offsets[i], self._fragment_offsets[i+1]
+        return " ".join(str(self.fragments[f])
+                        for f in self._event_fragments[start:end])
+
+    def event_string(self, i):
+        ''' The i-th event, formatted the way the Event object prints.
+        '''
+        if i in self._custom_reprs:
+            return self._custom_reprs[i]
+        actors = self._actors[self._actor_offsets[i]:self._actor_offsets[i+1]]
+        reprs = ", ".join(self._actor_reprs[a] for a in actors)
+        if len(actors) == 1:
+            reprs += ","  # Match the repr of a one-element tuple
+        return f"{self._event_names[self._events[i]]}({reprs})"
+
+    def render(self, processes=None):
+        ''' Render any deferred narration fragments to strings.
+
+        Args:
+            processes: If not None, the number of worker processes to render
+                       the text with.
+        '''
+        render_all(self.fragments, processes)
+        self.fragments[:] = [self._texts.setdefault(text, text)
+                             for text in map(str, self.fragments)]
+
+    # Queries
+    def involving(self, actor):
+        ''' All events involving an actor.
+
+        Args:
+            actor: An Actor, or an actor's name.
+        '''
+        name = getattr(actor, "name", actor)
+        ids = {i for i, actor_name in enumerate(self._actor_names)
+               if actor_name == name}
+        return [self[i] for i in range(len(self))
+                if not ids.isdisjoint(
+                    self._actors[self._actor_offsets[i]:
+                                 self._actor_offsets[i+1]])]
+
+    def of_class(self, event):
+        ''' All events of a given Event class.
+
+        Args:
+            event: An Event class, or the name of one.
+        '''
+        event_id = self._event_ids.get(getattr(event, "__name__", event))
+        return [self[i] for i, this_id in enumerate(self._events)
+                if this_id == event_id]
+
+    def at_step(self, step):
+        ''' All events that happened during a given model step.
+        '''
+        start = bisect_left(self._steps, step)
+        end = bisect_left(self._steps, step + 1, start)
+        return self[start:end]
+
+    def clear(self):
+        ''' Forget every event and fragment logged so far.
+        '''
+        self._reset()
+
+    def truncate(self, events, fragments):
+        ''' Forget everything logged after the first `events` events and
+        `fragments` fragments.
+        '''
+        del self.fragments[fragments:]
+        del self._steps[events:]
+        del self._events[events:]
+        del self._actors[self._actor_offsets[events]:]
+        del self._actor_offsets[events + 1:]
+        del self._event_fragments[self._fragment_offsets[events]:]
+        del self._fragment_offsets[events + 1:]
+        del self._text_positions[events:]
+        for i in [i for i in self._custom_reprs if i >= events]:
+            del self._custom_reprs[i]
+
+
+class _HistoryView(Sequence):
+    ''' Base for read-only list-like views of an EventLog.
+    '''
+
+    def __init__(self, log):
+        self._log = log
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f"{self.__class__.__name__} index out of range")
+        return self._item(i)
+
+    def __eq__(self, other):
+        if isinstance(other, (list, _HistoryView)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class TextHistory(_HistoryView):
+    ''' Every narration fragment as it was narrated, and each event's whole
+    paragraph once the event finishes, as a read-only sequence of strings.
+    '''
+
+    def __len__(self):
+        return len(self._log.fragments) + len(self._log)
+
+    def _item(self, i):
+        log = self._log
+        event = bisect_left(log._text_positions, i)
+        if event < len(log) and log._text_positions[event] == i:
+            return log.paragraph(event)
+        return str(log.fragments[i - event])
+
+    def __iter__(self):
+        log = self._log
+        fragment = 0
+        for event, position in enumerate(log._text_positions):
+            while fragment + event < position:
+                yield str(log.fragments[fragment])
+                fragment += 1
+            yield log.paragraph(event)
+        for text in log.fragments[fragment:]:
+            yield str(text)
+
+
+class EventHistory(_HistoryView):
+    ''' Every event that has run, printed as a string, as a read-only
+    sequence.
+    '''
+
+    def __len__(self):
+        return len(self._log)
+
+    def _item(self, i):
+        return self._log.event_string(i)
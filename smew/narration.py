@@ -0,0 +1,266 @@
+from functools import lru_cache
+import multiprocessing
+import random
+
+import tracery
+
+# Parsing a rule only depends on its text, so the result can be shared
+# between every expansion of it.
+_parse = lru_cache(maxsize=4096)(tracery.parse)
+
+
+class GrammarDict(dict):
+    ''' A dictionary of Tracery rules that counts the changes made to it, so
+    that anything built from it can tell when it is out of date.
+
+    `version` goes up every time a rule is added, replaced or removed (but
+    not when a rule's list of expansions is changed in place).
+    '''
+
+    version = 0
+
+    def _changed(self):
+        self.version += 1
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._changed()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._changed()
+
+    def __ior__(self, other):
+        result = super().__ior__(other)
+        self._changed()
+        return result
+
+    def clear(self):
+        super().clear()
+        self._changed()
+
+    def pop(self, *args):
+        result = super().pop(*args)
+        self._changed()
+        return result
+
+    def popitem(self):
+        result = super().popitem()
+        self._changed()
+        return result
+
+    def setdefault(self, key, default=None):
+        result = super().setdefault(key, default)
+        self._changed()
+        return result
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._changed()
+
+
+class NarrationGrammar(tracery.Grammar):
+    ''' A Tracery grammar for a single narration, layered over shared rules.
+
+    Building a tracery.Grammar creates a Symbol for every rule it is given.
+    This grammar instead takes a (shared, never modified) dictionary of rules
+    and an overlay of per-narration rules, and only creates Symbols for the
+    keys that actually get expanded. Rules in the overlay take precedence
+    over the shared ones. Expansions behave exactly like a tracery.Grammar
+    built from the two dictionaries merged together, except that rules are
+    chosen with the given random number generator.
+    '''
+
+    def __init__(self, rules, overlay=None, rng=random):
+        ''' Create a new narration grammar.
+
+        Args:
+            rules: A dictionary of Tracery rules, shared with other grammars.
+            overlay: If not None, a dictionary of additional rules.
+            rng: A random.Random (or the random module) to choose rules with.
+        '''
+        self.modifiers = {}
+        self.raw = rules
+        self.symbols = {}
+        self.subgrammars = []
+        self.errors = []
+        self.settings = {}
+        self._rules = rules
+        self._overlay = overlay if overlay is not None else {}
+        self.rng = rng
+
+    def _symbol(self, key):
+        ''' Get the Symbol for a key, creating it on first use.
+        '''
+        symbol = self.symbols.get(key)
+        if symbol is None:
+            if key in self._overlay:
+                raw_rules = self._overlay[key]
+            elif key in self._rules:
+                raw_rules = self._rules[key]
+            else:
+                return None
+            symbol = self.symbols[key] = tracery.Symbol(self, key, raw_rules)
+        return symbol
+
+    def create_root(self, rule):
+        return _CachedNode(self, 0, {'type': -1, 'raw': rule})
+
+    def push_rules(self, key, raw_rules, source_action=None):
+        symbol = self._symbol(key)
+        if symbol is None:
+            self.symbols[key] = tracery.Symbol(self, key, raw_rules)
+        else:
+            symbol.push_rules(raw_rules)
+
+    def pop_rules(self, key):
+        symbol = self._symbol(key)
+        if symbol is None:
+            self.errors.append("Can't pop: no symbol for key " + key)
+        else:
+            symbol.pop_rules()
+
+    def select_rule(self, key, node, errors):
+        symbol = self._symbol(key)
+        if symbol is None:
+            errors.append("No symbol for " + str(key))
+            return "((" + str(key) + "))"
+        if len(symbol.stack) == 0:
+            errors.append("The rule stack for '" + key +
+                          "' is empty, too many pops?")
+        return self.rng.choice(symbol.stack[-1].default_rules)
+
+
+class _CachedNode(tracery.Node):
+    ''' A tracery Node that reuses the parsed form of the rules it expands.
+    '''
+
+    def expand_children(self, child_rule, prevent_recursion=False):
+        self.children = []
+        self.finished_text = ""
+
+        self.child_rule = child_rule
+        if self.child_rule is not None:
+            sections, errors = _parse(child_rule)
+            self.errors.extend(errors)
+            for i, section in enumerate(sections):
+                node = _CachedNode(self, i, section)
+                self.children.append(node)
+                if not prevent_recursion:
+                    node.expand(prevent_recursion)
+                self.finished_text += node.finished_text
+        else:
+            self.errors.append("No child rule provided, can't expand children")
+
+
+def render_narration(rules, origin, kwargs, seed):
+    ''' Render one piece of narration text.
+
+    Args:
+        rules: Dictionary of Tracery rules (the model and event grammars).
+        origin: The symbol to start expanding from.
+        kwargs: The keyword arguments passed to `Event.narrate`; if "_text" is
+                one of them, it is expanded instead of the origin.
+        seed: Seed for the random choices made while expanding.
+
+    Returns:
+        The narration string.
+    '''
+    grammar = NarrationGrammar(rules, {k: str(v) for k, v in kwargs.items()},
+                               random.Random(seed))
+    if "_text" in kwargs:
+        return grammar.flatten(kwargs["_text"]).format(**kwargs)
+    return grammar.flatten("#{}#".format(origin)).format(**kwargs)
+
+
+class ActorSnapshot:
+    ''' A frozen copy of an Actor's attributes, for rendering text later.
+
+    Renders as the actor's name, and, like an Actor, gives None for any
+    attribute it doesn't have.
+    '''
+
+    def __init__(self, actor):
+        self.__dict__.update((key, value) for key, value in actor._attributes().items()
+                             if not key.startswith("_"))
+        self.tags = list(actor._tags)
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return None
+
+    def __str__(self):
+        return self.name
+
+    def __repr__(self):
+        return f"ActorSnapshot({self.name}, {self.tags})"
+
+
+class DeferredText:
+    ''' Narration text that is only rendered when it is needed.
+
+    Holds everything `render_narration` needs; converting it to a string
+    renders it (once).
+    '''
+
+    __slots__ = ("rules", "origin", "kwargs", "seed", "_text")
+
+    def __init__(self, rules, origin, kwargs, seed):
+        self.rules = rules
+        self.origin = origin
+        self.kwargs = kwargs
+        self.seed = seed
+        self._text = None
+
+    @property
+    def rendered(self):
+        return self._text is not None
+
+    def render(self):
+        if self._text is None:
+            self._set_text(render_narration(self.rules, self.origin,
+                                            self.kwargs, self.seed))
+        return self._text
+
+    def _set_text(self, text):
+        self._text = text
+        # The inputs aren't needed any more once the text exists.
+        self.rules = self.origin = self.kwargs = None
+
+    def __str__(self):
+        return self.render()
+
+    def __repr__(self):
+        state = repr(self._text) if self.rendered else "not rendered"
+        return f"DeferredText({state})"
+
+
+def _render_args(args):
+    return render_narration(*args)
+
+
+def render_all(texts, processes=None, chunksize=64):
+    ''' Render every DeferredText in an iterable in one batch.
+
+    Args:
+        texts: An iterable of strings and DeferredTexts.
+        processes: If not None, the number of worker processes to render
+                   with; rendering is deterministic, so the output is the same
+                   either way.
+        chunksize: How many texts to send to a worker process at a time.
+    '''
+    pending = {}  # id -> DeferredText, so that each is only rendered once
+    for text in texts:
+        if isinstance(text, DeferredText) and not text.rendered:
+            pending[id(text)] = text
+    pending = list(pending.values())
+    args = [(text.rules, text.origin, text.kwargs, text.seed)
+            for text in pending]
+    if processes is not None and len(pending) > 0:
+        with multiprocessing.Pool(processes) as pool:
+            rendered = pool.map(_render_args, args, chunksize)
+    else:
+        rendered = [render_narration(*arg) for arg in args]
+    for text, result in zip(pending, rendered):
+        text._set_text(result)
@@ -0,0 +1,171 @@
+from time import perf_counter
+
+
+class EventStats:
+    ''' Counts and cumulative times for one Event class.
+
+    candidates: Number of combinations of actors generated to check.
+    filtered: Number of times `filter` was called (or combinations checked
+              at once by `vector_filter`).
+    passed: Number of times `filter` returned True (or combinations that
+            passed `vector_filter`).
+    fired: Number of times the event ran.
+    time: Dictionary of the total seconds spent in each phase: generating
+          combinations ("get_matching"), "filter", "action" and "narrate".
+          Times include any time spent in other phases (or other events) from
+          within them, e.g. "action" includes "narrate".
+    '''
+
+    phases = ("get_matching", "filter", "action", "narrate")
+
+    def __init__(self):
+        self.candidates = 0
+        self.filtered = 0
+        self.passed = 0
+        self.fired = 0
+        self.time = dict.fromkeys(self.phases, 0.0)
+
+    def as_dict(self):
+        return {"candidates": self.candidates, "filtered": self.filtered,
+                "passed": self.passed, "fired": self.fired,
+                "time": dict(self.time)}
+
+
+class Profiler:
+    ''' Records where a model spends its time, for each Event class.
+
+    Start one with `SmewModel.start_profiling()`. Hooks added with `add_hook`
+    are called after each timed operation as `hook(phase, event_class,
+    seconds)`, where `phase` is one of EventStats.phases or "to_state" (for
+    which `event_class` is None).
+    '''
+
+    def __init__(self):
+        self.events = {}  # Event class -> EventStats
+        self.to_state_calls = 0
+        self.to_state_time = 0.0
+        self.hooks = []
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def stats(self, event_class):
+        ''' Get the EventStats for an Event class.
+        '''
+        stats = self.events.get(event_class)
+        if stats is None:
+            stats = self.events[event_class] = EventStats()
+        return stats
+
+    def record(self, phase, event_class, seconds):
+        ''' Add the time spent on one operation.
+        '''
+        if event_class is None:
+            self.to_state_calls += 1
+            self.to_state_time += seconds
+        else:
+            stats = self.stats(event_class)
+            stats.time[phase] += seconds
+            if phase == "action":
+                stats.fired += 1
+        for hook in self.hooks:
+            hook(phase, event_class, seconds)
+
+    def call(self, phase, event_class, function, *args, **kwargs):
+        ''' Call a function, recording the time it takes.
+        '''
+        start = perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.record(phase, event_class, perf_counter() - start)
+
+    def matching(self, event_class, combinations):
+        ''' Pass through an iterable of actor combinations, counting them and
+        timing how long they take to generate.
+        '''
+        stats = self.stats(event_class)
+        combinations = iter(combinations)
+        elapsed = 0.0
+        try:
+            while True:
+                start = perf_counter()
+                try:
+                    actors = next(combinations)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += perf_counter() - start
+                stats.candidates += 1
+                yield actors
+        finally:
+            self.record("get_matching", event_class, elapsed)
+
+    def count_filtered(self, event_class, checked, passed):
+        ''' Add combinations of actors that were checked all at once, e.g.
+        by a `vector_filter`, and how many of them passed.
+        '''
+        stats = self.stats(event_class)
+        stats.candidates += checked
+        stats.filtered += checked
+        stats.passed += passed
+
+    def wrap_filter(self, probe):
+        ''' Make an Event instance's `filter` count and time its calls.
+        '''
+        event_class = type(probe)
+        stats = self.stats(event_class)
+        event_filter = type(probe).filter.__get__(probe)
+
+        def timed_filter(*actors):
+            start = perf_counter()
+            result = event_filter(*actors)
+            seconds = perf_counter() - start
+            stats.filtered += 1
+            if result:
+                stats.passed += 1
+            stats.time["filter"] += seconds
+            for hook in self.hooks:
+                hook("filter", event_class, seconds)
+            return result
+
+        probe.filter = timed_filter
+
+    def report(self):
+        ''' All the statistics, as a dictionary.
+
+        Returns:
+            {"events": {Event class name: EventStats.as_dict()},
+             "to_state": {"calls": count, "time": seconds}}
+        '''
+        return {"events": {event_class.__name__: stats.as_dict()
+                           for event_class, stats in self.events.items()},
+                "to_state": {"calls": self.to_state_calls,
+                             "time": self.to_state_time}}
+
+    def reset(self):
+        ''' Set every count and time back to zero.
+        '''
+        for stats in self.events.values():
+            stats.__init__()
+        self.to_state_calls = 0
+        self.to_state_time = 0.0
+
+    def __str__(self):
+        header = ("Event", "candidates", "filtered", "passed", "fired",
+                  "matching s", "filter s", "action s", "narrate s")
+        rows = [header]
+        for event_class, stats in self.events.items():
+            rows.append((event_class.__name__, stats.candidates,
+                         stats.filtered, stats.passed, stats.fired) +
+                        tuple(f"{stats.time[phase]:.4f}"
+                              for phase in EventStats.phases))
+        widths = [max(len(str(row[i])) for row in rows)
+                  for i in range(len(header))]
+        lines = ["  ".join(str(value).rjust(width) if i else
+                           str(value).ljust(width)
+                           for i, (value, width) in enumerate(zip(row, widths)))
+                 for row in rows]
+        lines.append(f"to_state: {self.to_state_calls} calls, "
+                     f"{self.to_state_time:.4f} s")
+        return "\n".join(lines)
@@ -0,0 +1,204 @@
+class RelationshipStore:
+    ''' An indexed collection of (subject, relation, object) triples.
+
+    Subjects and objects are actor names. Besides the set of triples itself,
+    the store keeps a subject -> relation -> objects index and an
+    object -> relation -> subjects index, so membership tests and lookups in
+    either direction don't need to scan every relationship.
+
+    Iterating over the store yields the triples in the order they were added.
+    '''
+
+    depth = 0  # How many stores this one is layered over (see below)
+
+    def __init__(self, triples=None):
+        ''' Create a new relationship store.
+
+        Args:
+            triples: If not None, an iterable of (subject, relation, object)
+                     triples (or lists) to start with.
+        '''
+        # Dictionaries are used as insertion-ordered sets throughout, so that
+        # lookups return actors in the order the relationships were created.
+        self._triples = {}
+        self._by_subject = {}
+        self._by_object = {}
+        if triples is not None:
+            for triple in triples:
+                self.add(tuple(triple))
+
+    def __contains__(self, triple):
+        return triple in self._triples
+
+    def __iter__(self):
+        return iter(self._triples)
+
+    def __len__(self):
+        return len(self._triples)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({list(self._triples)})"
+
+    def add(self, triple):
+        ''' Add a triple to the store.
+
+        Returns:
+            True if the triple was added, False if it was already present.
+        '''
+        if triple in self._triples:
+            return False
+        subject, relation, obj = triple
+        self._triples[triple] = None
+        (self._by_subject.setdefault(subject, {})
+                         .setdefault(relation, {}))[obj] = None
+        (self._by_object.setdefault(obj, {})
+                        .setdefault(relation, {}))[subject] = None
+        return True
+
+    def remove(self, triple):
+        ''' Remove a triple from the store.
+
+        Raises:
+            ValueError if the triple is not in the store.
+        '''
+        if triple not in self._triples:
+            raise ValueError(f"{triple} is not in the relationships")
+        subject, relation, obj = triple
+        del self._triples[triple]
+        self._discard_index(self._by_subject, subject, relation, obj)
+        self._discard_index(self._by_object, obj, relation, subject)
+
+    def objects(self, subject, relation):
+        ''' Names of all actors matching (subject, relation, *).
+        '''
+        return list(self._by_subject.get(subject, {}).get(relation, ()))
+
+    def subjects(self, relation, obj):
+        ''' Names of all actors matching (*, relation, obj).
+        '''
+        return list(self._by_object.get(obj, {}).get(relation, ()))
+
+    def involving(self, name):
+        ''' All triples with the given actor name as subject or object.
+        '''
+        triples = []
+        for relation, objects in self._by_subject.get(name, {}).items():
+            triples += [(name, relation, obj) for obj in objects]
+        for relation, subjects in self._by_object.get(name, {}).items():
+            triples += [(subject, relation, name) for subject in subjects
+                        if subject != name]
+        return triples
+
+    def remove_actor(self, name):
+        ''' Remove every triple involving the given actor name.
+
+        Returns:
+            The list of triples that were removed.
+        '''
+        removed = self.involving(name)
+        for triple in removed:
+            self.remove(triple)
+        return removed
+
+    def layer(self):
+        ''' A new store layered over this one (see LayeredRelationshipStore).
+        '''
+        return LayeredRelationshipStore(self)
+
+    def flattened(self):
+        ''' A new, independent store with the same triples as this one.
+        '''
+        return RelationshipStore(self)
+
+    @staticmethod
+    def _discard_index(index, key, relation, value):
+        relations = index[key]
+        values = relations[relation]
+        del values[value]
+        if not values:
+            del relations[relation]
+            if not relations:
+                del index[key]
+
+
+class LayeredRelationshipStore(RelationshipStore):
+    ''' A RelationshipStore that starts out sharing another store's triples.
+
+    Triples added to this store are kept in its own indexes, and triples of
+    the base store that are removed from this one are just marked as
+    removed, so the base store is never modified, and creating a layered
+    store doesn't copy anything. The base store must not be modified
+    afterwards either, since its triples show through.
+    '''
+
+    def __init__(self, base):
+        ''' Create a new store layered over `base`.
+        '''
+        super().__init__()
+        self._base = base
+        self._removed = {}  # Triples in the base store removed from this one
+        self.depth = base.depth + 1
+
+    @property
+    def changed(self):
+        ''' Whether this store differs from its base store.
+        '''
+        return bool(self._triples or self._removed)
+
+    def __contains__(self, triple):
+        return triple in self._triples or (triple in self._base and
+                                           triple not in self._removed)
+
+    def __iter__(self):
+        for triple in self._base:
+            if triple not in self._removed:
+                yield triple
+        yield from self._triples
+
+    def __len__(self):
+        return len(self._base) - len(self._removed) + len(self._triples)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({list(self)})"
+
+    def add(self, triple):
+        if triple in self:
+            return False
+        # A base triple that was removed and added again stays marked as
+        # removed, so that it is ordered as if it had just been added.
+        return super().add(triple)
+
+    def remove(self, triple):
+        if triple in self._triples:
+            super().remove(triple)
+        elif triple in self._base and triple not in self._removed:
+            self._removed[triple] = None
+        else:
+            raise ValueError(f"{triple} is not in the relationships")
+
+    def objects(self, subject, relation):
+        return [obj for obj in self._base.objects(subject, relation)
+                if (subject, relation, obj) not in self._removed] + \
+            super().objects(subject, relation)
+
+    def subjects(self, relation, obj):
+        return [subject for subject in self._base.subjects(relation, obj)
+                if (subject, relation, obj) not in self._removed] + \
+            super().subjects(relation, obj)
+
+    def involving(self, name):
+        return [triple for triple in self._base.involving(name)
+                if triple not in self._removed] + super().involving(name)
+
+    def merge(self):
+        ''' Apply this store's changes to its base store.
+
+        Returns:
+            The base store, which then holds the same triples, in the same
+            order, as this one.
+        '''
+        for triple in self._removed:
+            self._base.remove(triple)
+        for triple in self._triples:
+            self._base.add(triple)
+        return self._base
@@ -0,0 +1,218 @@
+from collections import namedtuple
+import random
+import time
+
+
+SearchResult = namedtuple("SearchResult", ["score", "events", "text", "model"])
+SearchResult.__doc__ = ''' The best story a search found.
+
+    score: The score of the model at the end of the story.
+    events: List of the events in the story, as strings.
+    text: List of the narration paragraphs of those events.
+    model: A copy of the model at the end of the story, which can be run
+           further.
+'''
+
+# A story being searched: its score, the events and text so far, and a model
+# at the end of it.
+_Node = namedtuple("_Node", ["score", "events", "text", "model"])
+
+
+class _Budget:
+    ''' Keeps track of how many steps and how much time a search has used.
+    '''
+
+    def __init__(self, max_nodes=None, time_limit=None):
+        self.max_nodes = max_nodes
+        self.deadline = None
+        if time_limit is not None:
+            self.deadline = time.perf_counter() + time_limit
+        self.nodes = 0
+
+    def spent(self):
+        return ((self.max_nodes is not None and self.nodes >= self.max_nodes)
+                or (self.deadline is not None and
+                    time.perf_counter() >= self.deadline))
+
+
+def _run(model, candidate):
+    ''' Run one candidate event as the model's next step.
+
+    Returns:
+        The events that happened (including any the candidate ran itself),
+        as strings, and their narration text.
+    '''
+    start = len(model.event_log)
+    model.run_candidate(candidate)
+    return (list(model.event_history[start:]),
+            [event.text for event in model.event_log[start:]])
+
+
+def _start(model, seed):
+    ''' Fork the model to search from, so the original isn't changed.
+    '''
+    root = model.fork(seed=seed, verbose=False)
+    root.keep_history = True
+    return root
+
+
+def beam_search(model, score, depth=10, width=5, goal=None, max_nodes=None,
+                time_limit=None, seed=None):
+    ''' Search for the highest-scoring story, keeping the best few at a time.
+
+    Starting from the model's current state, tries every possible next
+    event for each of the `width` best stories so far, and keeps the `width`
+    best of the results; repeats this `depth` times. States that have already
+    been reached by another story are skipped.
+
+    Args:
+        model: The SmewModel to search from; it isn't changed.
+        score: A function that takes a model and returns a number; higher is
+               better.
+        depth: The maximum number of steps in a story.
+        width: How many stories to keep after each step.
+        goal: If not None, a function that takes a model and returns True if
+              it has reached the goal; the search stops at the first story
+              that does.
+        max_nodes: If not None, stop after trying this many events.
+        time_limit: If not None, stop after about this many seconds.
+        seed: If not None, the seed for the searched models' random number
+              generators.
+
+    Returns:
+        A SearchResult for the best story found; the goal story, if one was
+        found; or the highest scoring story tried before the search ran out
+        of steps or time.
+    '''
+    budget = _Budget(max_nodes, time_limit)
+    root = _start(model, seed)
+    best = _Node(score(root), [], [], root)
+    if goal is not None and goal(root):
+        return SearchResult(*best)
+    best_child = None
+    visited = {root.state_hash()}
+    beam = [best]
+
+    for _ in range(depth):
+        children = []  # (score, parent node, candidate)
+        for node in beam:
+            for candidate in list(node.model.iter_candidates()):
+                if budget.spent():
+                    break
+                node.model.begin()
+                _run(node.model, candidate)
+                budget.nodes += 1
+                key = node.model.state_hash()
+                if key not in visited:
+                    visited.add(key)
+                    child = (score(node.model), node, candidate)
+                    children.append(child)
+                    if best_child is None or child[0] > best_child[0]:
+                        best_child = child
+                    if goal is not None and goal(node.model):
+                        node.model.rollback()
+                        return SearchResult(*_expand(*child))
+                node.model.rollback()
+        if not children:
+            break
+        children.sort(key=lambda child: child[0], reverse=True)
+        beam = [_expand(*child) for child in children[:width]]
+        if budget.spent():
+            break
+
+    if best_child is not None and best_child[0] > best.score:
+        best = _expand(*best_child)
+    return SearchResult(*best)
+
+
+def _expand(score, node, candidate):
+    ''' Create the node for running a candidate after `node`.
+
+    The parent model's random state is the same as when the candidate was
+    tried, so the new copy gets exactly the same result.
+    '''
+    model = node.model.fork()
+    events, text = _run(model, candidate)
+    return _Node(score, node.events + events, node.text + text, model)
+
+
+def monte_carlo_search(model, score, depth=10, rollouts=10, horizon=10,
+                       goal=None, max_nodes=None, time_limit=None, seed=None):
+    ''' Choose events one at a time by how well random stories after them do.
+
+    At each step, tries every possible next event; after each one, runs the
+    model on randomly for up to `horizon` more steps, `rollouts` times, and
+    scores the end results. The event with the best average score is chosen,
+    and the process repeats up to `depth` times. Average scores are
+    remembered by state, so states reached more than once are only rolled
+    out once. When `max_nodes` or `time_limit` runs out, the random
+    continuations stop where they are, and the best event so far is chosen.
+
+    Args:
+        model: The SmewModel to search from; it isn't changed.
+        score: A function that takes a model and returns a number; higher is
+               better.
+        depth: The maximum number of steps in the story.
+        rollouts: How many random continuations to try after each event.
+        horizon: How many steps each random continuation runs for.
+        goal: If not None, a function that takes a model and returns True if
+              it has reached the goal; the search stops when the story does.
+        max_nodes: If not None, stop after running this many events in total
+                   (including the random continuations).
+        time_limit: If not None, stop after about this many seconds.
+        seed: If not None, the seed for the searched models' random number
+              generators, and for the random continuations.
+
+    Returns:
+        A SearchResult for the story that was chosen.
+    '''
+    budget = _Budget(max_nodes, time_limit)
+    root = _start(model, seed)
+    rng = random.Random(root.rng.getrandbits(64))
+    values = {}  # State hash -> average score of its rollouts
+    events, text = [], []
+
+    for _ in range(depth):
+        if (goal is not None and goal(root)) or budget.spent():
+            break
+        chosen = None
+        best_value = None
+        for candidate in list(root.iter_candidates()):
+            if chosen is not None and budget.spent():
+                break
+            root.begin()
+            _run(root, candidate)
+            budget.nodes += 1
+            key = root.state_hash()
+            value = values.get(key)
+            if value is None:
+                total = 0
+                finished = 0
+                for _ in range(rollouts):
+                    if finished and budget.spent():
+                        break
+                    root.begin()
+                    root.rng.seed(rng.getrandbits(64))
+                    # Run the rollout a step at a time, so that it stops
+                    # as soon as the budget is spent.
+                    steps = 0
+                    while (not root.ended and steps < horizon and
+                           not budget.spent()):
+                        step = root.step
+                        root.advance()
+                        steps += 1
+                        budget.nodes += root.step - step
+                    total += score(root)
+                    finished += 1
+                    root.rollback()
+                value = values[key] = total / finished
+            root.rollback()
+            if best_value is None or value > best_value:
+                chosen, best_value = candidate, value
+        if chosen is None:
+            break
+        new_events, new_text = _run(root, chosen)
+        events += new_events
+        text += new_text
+
+    return SearchResult(score(root), events, text, root)
@@ -0,0 +1,113 @@
+from abc import ABC, abstractmethod
+import json
+import os
+
+
+class Sink(ABC):
+    ''' Base for destinations that a model run's StepRecords are streamed to.
+
+    Subclasses must implement `write`; `flush` and `close` do nothing by
+    default. Sinks can be used as context managers, which close them at the
+    end.
+    '''
+
+    states = False  # Whether the sink needs each record's model state
+
+    @abstractmethod
+    def write(self, record):
+        ''' Handle one StepRecord.
+        '''
+        pass
+
+    def flush(self):
+        ''' Make sure every record written so far has been handled.
+        '''
+        pass
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class FileSink(Sink):
+    ''' Base for sinks that write one line (or more) of text per record.
+
+    Formatted records are buffered and written to the file in bulk every
+    `buffer_size` records, then flushed, so other processes can follow the
+    file (e.g. with `tail -f`) while the model runs.
+    '''
+
+    def __init__(self, file, buffer_size=64, mode="w"):
+        ''' Create a new file sink.
+
+        Args:
+            file: A path to open, or an already open text file; files opened
+                  by the sink are closed when it is.
+            buffer_size: How many records to hold before writing them out.
+            mode: The mode to open `file` with, if it is a path: "w" (the
+                  default) to overwrite it, or "a" to add to it.
+        '''
+        if isinstance(file, (str, os.PathLike)):
+            self._file = open(file, mode, encoding="utf-8")
+            self._owns_file = True
+        else:
+            self._file = file
+            self._owns_file = False
+        self.buffer_size = buffer_size
+        self._buffer = []
+
+    @abstractmethod
+    def format(self, record):
+        ''' The text to write for a record.
+        '''
+        pass
+
+    def write(self, record):
+        self._buffer.append(self.format(record))
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self._file.write("".join(self._buffer))
+            self._buffer = []
+        self._file.flush()
+
+    def close(self):
+        self.flush()
+        if self._owns_file:
+            self._file.close()
+
+
+class JSONLinesSink(FileSink):
+    ''' Writes each step as one line of JSON (see StepRecord.as_dict).
+
+    Values that JSON can't represent, such as Actors stored as properties,
+    are written as strings.
+    '''
+
+    def __init__(self, file, buffer_size=64, mode="w", states=False):
+        ''' Create a new JSON Lines sink.
+
+        Args:
+            file, buffer_size, mode: See FileSink.
+            states: If True, include the model state after each step.
+        '''
+        super().__init__(file, buffer_size, mode)
+        self.states = states
+
+    def format(self, record):
+        return json.dumps(record.as_dict(), default=str) + "\n"
+
+
+class TextSink(FileSink):
+    ''' Writes the narration text of each event, one paragraph per line.
+    '''
+
+    def format(self, record):
+        return "".join(event.text + "\n" for event in record.events)
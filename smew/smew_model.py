@@ -1,8 +1,40 @@
 from abc import ABC, abstractmethod
+from collections import namedtuple
+from operator import attrgetter
 import random
+import warnings
+import weakref
 from itertools import permutations, product
 
-import tracery
+from . import history
+from .hashing import feature_hash
+from .history import StateHistory
+from .indexes import LayeredSetIndex, SetIndex
+from .log import EventLog, StepRecord
+from .narration import (ActorSnapshot, DeferredText, GrammarDict,
+                        render_narration)
+from .profiling import Profiler
+from .relationships import LayeredRelationshipStore, RelationshipStore
+
+try:
+    from . import vectorized
+except ImportError:  # NumPy isn't installed
+    vectorized = None
+
+
+# Kinds of entries in a model's transaction journal
+_SET = 0  # (_SET, actor, attribute, old value or _MISSING)
+_TAG_ADDED = 1  # (_TAG_ADDED, actor, tag)
+_TAG_REMOVED = 2  # (_TAG_REMOVED, actor, tag, position in the actor's tags)
+_ACTOR_ADDED = 3  # (_ACTOR_ADDED, actor)
+_ACTOR_REMOVED = 4  # (_ACTOR_REMOVED, actor)
+_MISSING = object()
+
+# What a model looked like when a transaction began
+_Transaction = namedtuple("_Transaction", [
+    "journal_length", "relationships", "events", "fragments", "states",
+    "changes", "changes_length", "step", "ended", "rng", "narration_rng",
+    "n_events", "candidates", "candidate_index", "dirty"])
 
 
 class Event(ABC):
@@ -11,10 +43,45 @@ class Event(ABC):
     Events have two required methods: `filter`, and `action`.
     `filter` determines whether an event can be applied to given actors;
     `action` determines what happens when the event is activated with them.
+    The model calls `filter` on a single shared instance of each Event class,
+    so it should only depend on the actors passed to it, not on `self`'s
+    own actors.
+
+    `same` can map property names to the positions of actors that must share
+    that property's value; e.g. `same = {"location": (0, 1)}` means the first
+    two actors must be in the same location. The model only generates
+    combinations of actors that satisfy it, using an index of actors by
+    property value, so `filter` doesn't need to check it again.
+
+    Setting `trigger_only = True` on an Event class means the model will never
+    choose it by itself; it only happens when it is run directly (e.g. from
+    another event's `action`), so its `filter` is never checked.
+
+    If NumPy is installed, an Event class can also define a `vector_filter`
+    method, which checks every combination of actors at once. It is called
+    with an ActorColumns object for each position of the event: reading a
+    property from one (e.g. `a.location`) gives a NumPy array of that
+    property for every actor that could fill that position, and
+    `self.related_mask(a, relation, b)` gives a boolean array of which of
+    them are related. It should return a boolean array of which combinations
+    pass, e.g.
+
+        def vector_filter(self, a, b):
+            return ((a.location == b.location) &
+                    ~self.related_mask(a, "noticed", b))
+
+    The model uses it instead of calling `filter` on each combination when
+    it checks every combination of actors for an event. It must give the
+    same results as `filter`, which is still used for everything else (e.g.
+    sampling events).
     '''
 
     match = None
     narrative = [""]
+    same = None
+    trigger_only = False
+    weight = 1  # Relative probability, used by the "weighted" selection mode
+    vector_filter = None  # Optional filter of all combinations; see above
 
     def __init__(self, model, *args):
         ''' Create a new (potential) event.
@@ -26,6 +93,7 @@ class Event(ABC):
         self.model = model
         self._actors = args
         self._narration = []  # List of text generated by the event
+        self._fragment_ids = []  # Ids of that text in the model's event log
 
     def __repr__(self):
         return f"{self.__class__.__name__}{tuple(self._actors)}"
@@ -56,12 +124,19 @@ class Event(ABC):
     def run(self):
         ''' Execute the event with the actors passed to it.
         '''
-        self.action(*self._actors)
-        self.model.event_history.append(str(self))
-        text = " ".join(self._narration)
-        self.model.text_history.append(text)
+        if self.model.profiler is None:
+            self.action(*self._actors)
+        else:
+            self.model.profiler.call("action", type(self), self.action,
+                                     *self._actors)
+        description = None
+        if _has_own_str(type(self)):
+            description = str(self)
+        self.model.event_log.add_event(self.model.step,
+                                       self.__class__.__name__, self._actors,
+                                       self._fragment_ids, description)
         if self.model.verbose:
-            print(text)
+            print(" ".join(str(text) for text in self._narration))
 
     def narrate(self, _origin='origin', **kwargs):
         ''' Add narration text describing the event.
@@ -74,18 +149,26 @@ class Event(ABC):
                       string.  If "_text" is in the dictionary, its value is
                       used verbatim instead.
         '''
-
-        # For every narration, build up a unique dictionary.
-        these_rules = {**self.model.grammar, **self.grammar,
-                       **{k: str(v) for k, v in kwargs.items()}}
-        grammar = tracery.Grammar(these_rules)
-
-        if "_text" in kwargs:
-            text = grammar.flatten(kwargs["_text"]).format(**kwargs)
+        if self.model.profiler is None:
+            self._narrate(_origin, kwargs)
+        else:
+            self.model.profiler.call("narrate", type(self), self._narrate,
+                                     _origin, kwargs)
+
+    def _narrate(self, _origin, kwargs):
+        # The model and event rules are merged once per Event class; each
+        # narration only adds its own arguments on top of them. Every
+        # narration gets its own seed, so it renders the same way whether it
+        # is rendered now or later.
+        rules = self.model._narration_rules(self)
+        seed = self.model._narration_rng.getrandbits(64)
+        if self.model.defer_narration:
+            kwargs = {k: ActorSnapshot(v) if isinstance(v, Actor) else v
+                      for k, v in kwargs.items()}
+            text = DeferredText(rules, _origin, kwargs, seed)
         else:
-            origin = "#{}#".format(_origin)
-            text = grammar.flatten(origin).format(**kwargs)
-        self.model.text_history.append(text)
+            text = render_narration(rules, _origin, kwargs, seed)
+        self._fragment_ids.append(self.model.event_log.add_fragment(text))
         self._narration.append(text)
 
     @property
@@ -97,12 +180,48 @@ class Event(ABC):
         else:
             raise SmewException("Narrative must be a list, or a dictionary")
 
+    def filter_prefix(self, *args):
+        '''
+        Check whether the first few Actors could be part of a valid event.
+
+        Optional; while building the combinations of actors for an event with
+        more than one actor, the model calls this with each partial
+        combination (the first actor, then the first two, and so on), and
+        stops extending any that fail. It is only a shortcut: `filter` must
+        still check all the conditions on the complete set of actors.
+
+        Args:
+            *args: The first one or more Actors of a potential event.
+
+        Returns:
+            Must return either True or False
+        '''
+        return True
+
+    def get_weight(self, *args):
+        ''' Relative weight of this event happening with the given Actors.
+
+        Only used when the model's `selection` is "weighted". Returns the
+        class's `weight` by default; override it to weigh by the actors.
+        '''
+        return self.weight
+
     @classmethod
     def n_actors(cls):
         return cls.action.__code__.co_argcount-1
 
     # Pass-throughs to parent model
     # ----------------------------------
+    @property
+    def rng(self):
+        ''' The parent model's random number generator.
+
+        Events should make their random choices with this (e.g.
+        `self.rng.choice(...)`) rather than the `random` module, so that a
+        model run can be repeated from its seed.
+        '''
+        return self.model.rng
+
     def get_actor(self, name):
         """
         Get an actor with a given name in the parent model.
@@ -113,7 +232,7 @@ class Event(ABC):
         Returns:
             The Actor object in the model with that name.
         """
-        return self.model.actors[name]
+        return self.model._actor_table[name]
 
     def get_event(self, name):
         '''
@@ -141,6 +260,18 @@ class Event(ABC):
         '''
         return self.model.get_related(a, b, c)
 
+    def related_mask(self, a, relation, b):
+        '''
+        In a `vector_filter`, a boolean array of which actors in `a` have the
+        relation to which actors in `b`.
+
+        args:
+            a, b: ActorColumns objects passed to `vector_filter`
+            relation: the relationship string
+        '''
+        return vectorized.related_mask(self.model.relationships, a, relation,
+                                       b)
+
     def relate(self, a, relation, b, reciprocal=True):
         '''
         Create a relationship between two actors.
@@ -173,9 +304,19 @@ class Event(ABC):
         self.model.ended = True
 
 
-class Actor:
-    ''' One actor or other entity in the narrative.
+class _SlottedActor(ABC):
+    ''' Everything an Actor does, without an instance dictionary, so that
+    the classes made by `Actor.with_schema` can keep all of their attributes
+    in slots.
     '''
+
+    __slots__ = ()
+    _model = None  # The SmewModel this actor is currently part of, if any
+    _order = 0  # Sorts the actors of a model in the order of all_actors
+    _tags = ()  # Tuple of the actor's tags, shared with other actors
+    schema = None  # Tuple of property names, for classes from `with_schema`
+    _slots = ()  # Attributes stored in slots rather than the instance dict
+
     def __init__(self, name, tags, properties=None):
         ''' Creates a new Smew Actor.
 
@@ -186,30 +327,187 @@ class Actor:
                   this Actor to Events.
             properties: If not None, a dictionary of properties and initial
                         values for this actor. Properties will be accessible
-                        via the . operator.
+                        via the . operator. If the actor's class has a schema,
+                        they must all be in it; the ones not given are None.
         '''
+        if self.schema is not None:
+            object.__setattr__(self, "_model", None)
+            object.__setattr__(self, "_tags", ())
+            object.__setattr__(self, "_order", 0)
+            for prop in self.schema:
+                object.__setattr__(self, prop, None)
+            if properties is not None:
+                unknown = [key for key in properties if key not in self.schema]
+                if unknown:
+                    raise SmewException(f"{name} has properties that aren't "
+                                        f"in its schema: {unknown}")
         self.name = name
-        if isinstance(tags, list):
-            self.tags = tags
-        else:
-            self.tags = [tags]
-        self.properties = []
+        self.tags = tags
+        if self.schema is None:
+            self.properties = []
+            if properties is not None:
+                self.properties = list(properties.keys())
         if properties is not None:
-            self.properties = list(properties.keys())
             for key, val in properties.items():
                 setattr(self, key, val)
 
+    @classmethod
+    def with_schema(cls, properties):
+        ''' Get a subclass of this class whose actors all have the same
+        properties, stored compactly.
+
+        Each property is stored in a slot, the actors have no per-actor
+        dictionary, and the list of property names is shared by the whole
+        class, so the actors use less memory and their properties are faster
+        to read. Every actor has every property (None unless it's given a
+        value), and properties not in the schema can't be given to the
+        constructor or set later. The actors of a schema made from Actor
+        itself are still instances of Actor; subclasses of Actor keep their
+        dictionary, though.
+
+        Args:
+            properties: List of property names.
+
+        Returns:
+            The subclass; calling it with the same properties again returns
+            the same class.
+        '''
+        properties = tuple(properties)
+        key = (cls, properties)
+        if key not in _schema_classes:
+            for prop in properties:
+                # "name" and "properties" are set on each actor rather than
+                # the class, so hasattr doesn't catch them.
+                if (prop.startswith("_") or prop in ("name", "properties")
+                        or hasattr(cls, prop)):
+                    raise SmewException(f"Can't use {prop!r} as an actor "
+                                        f"property in a schema")
+            if len(set(properties)) < len(properties):
+                raise SmewException(f"Repeated property in schema "
+                                    f"{properties}")
+            slots = ("name", "_tags", "_model", "_order") + properties
+            base = _SlottedActor if cls is Actor else cls
+            schema_class = type(cls.__name__, (base,), {
+                "__slots__": slots, "__module__": cls.__module__,
+                "schema": properties, "properties": properties,
+                "_slots": slots})
+            if base is not cls:
+                cls.register(schema_class)
+            _schema_classes[key] = schema_class
+        return _schema_classes[key]
+
+    @property
+    def tags(self):
+        ''' Tuple of the actor's tags, in the order they were added.
+
+        Change them with `add_tag` and `remove_tag`, or assign a string or
+        list of strings to replace them all.
+        '''
+        return self._tags
+
+    @tags.setter
+    def tags(self, tags):
+        if not isinstance(tags, list):
+            tags = [tags]
+        if self._model is None:
+            self._tags = _shared_tags(tags)
+            return
+        for tag in self._tags:
+            self.remove_tag(tag)
+        for tag in tags:
+            self.add_tag(tag)
+
     def has_tag(self, tag):
-        return tag in self.tags
+        return tag in self._tags
+
+    def add_tag(self, tag):
+        ''' Give the actor a new tag (no effect if it already has it).
+        '''
+        if tag not in self._tags:
+            if self._model is not None and self._model._snapshots is not None:
+                self._model._preserve(self.name, self)
+            self._tags += (tag,)
+            if self._model is not None:
+                if self._model._journal is not None:
+                    self._model._journal.append((_TAG_ADDED, self, tag))
+                self._model._tag_changed(self, tag, True)
+
+    def remove_tag(self, tag):
+        ''' Remove a tag from the actor (no effect if it doesn't have it).
+        '''
+        if tag in self._tags:
+            if self._model is not None and self._model._snapshots is not None:
+                self._model._preserve(self.name, self)
+            position = self._tags.index(tag)
+            if self._model is not None and self._model._journal is not None:
+                self._model._journal.append((_TAG_REMOVED, self, tag,
+                                             position))
+            self._tags = self._tags[:position] + self._tags[position + 1:]
+            if self._model is not None:
+                self._model._tag_changed(self, tag, False)
 
     def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
         return None
 
+    def __setattr__(self, name, value):
+        model = self._model
+        if model is None or name[0] == "_":
+            object.__setattr__(self, name, value)
+            return
+        if name == "tags":
+            # The tags setter reports (and journals) its changes one tag at a
+            # time, through add_tag and remove_tag; journaling the assignment
+            # too would make rollback try to delete the property.
+            object.__setattr__(self, name, value)
+            return
+        if name in self._slots:
+            old_value = getattr(self, name)
+        elif hasattr(self, "__dict__"):
+            old_value = self.__dict__.get(name, _MISSING)
+        else:
+            raise AttributeError(f"{self} has no {name!r} property in its "
+                                 f"schema")
+        if model._snapshots is not None:
+            model._preserve(self.name, self)
+        if model._journal is not None:
+            model._journal.append((_SET, self, name, old_value))
+        object.__setattr__(self, name, value)
+        model._actor_changed(self, name, old_value)
+
     def __str__(self):
         return self.name
 
     def __repr__(self):
-        return f"Actor({self.name}, {self.tags})"
+        return f"Actor({self.name}, {list(self._tags)})"
+
+    def _clone(self):
+        ''' A shallow copy of this actor, not part of any model.
+
+        The copy has its own tags and attributes, but shares the values of
+        its properties with this actor.
+        '''
+        clone = object.__new__(type(self))
+        if self.schema is not None:
+            for name, value in self._attributes().items():
+                object.__setattr__(clone, name, value)
+            object.__setattr__(clone, "_model", None)
+            return clone
+        attributes = dict(self.__dict__)
+        attributes.pop("_model", None)
+        attributes["properties"] = list(self.properties)
+        object.__setattr__(clone, "__dict__", attributes)
+        return clone
+
+    def _attributes(self):
+        ''' The attributes set on this actor (rather than its class), as a
+        dictionary, whether they're stored in slots or not.
+        '''
+        attributes = {name: getattr(self, name) for name in self._slots}
+        if hasattr(self, "__dict__"):
+            attributes.update(vars(self))
+        return attributes
     
     def _to_state(self):
         ''' Serializes this Actor's current state to a dictionary.
@@ -223,7 +521,7 @@ class Actor:
             }
         '''
         return {"name": self.name,
-                "tags": self.tags,
+                "tags": list(self._tags),
                 "properties": {prop: getattr(self, prop)
                                for prop in self.properties}}
     @classmethod
@@ -246,27 +544,205 @@ class Actor:
         return cls(**state)
 
 
+class Actor(_SlottedActor):
+    ''' One actor or other entity in the narrative.
+    '''
+
+
+def _shared_tags(tags):
+    ''' A tuple of the tags, without repeats, which is shared with other
+    actors given the same tags.
+    '''
+    tags = tuple(dict.fromkeys(tags))
+    if len(_tag_tuples) < _MAX_TAG_TUPLES:
+        tags = _tag_tuples.setdefault(tags, tags)
+    return tags
+
+
+_schema_classes = {}  # (Actor class, property names) -> class with slots
+_tag_tuples = {}  # Tuple of tags -> the same tuple, for actors to share
+_MAX_TAG_TUPLES = 10000  # Past this, actors with new tags don't share them
+_actor_order = attrgetter("_order")
+
+
+class _ActorTable(dict):
+    ''' The actors of a model made by `fork`, by name, which copies each
+    actor of the original model into the new one when it is first looked up.
+    '''
+
+    __slots__ = ("_model",)
+
+    def __init__(self, model):
+        super().__init__()
+        self._model = model
+
+    def __missing__(self, name):
+        actor = self._model._copy_actor(name)
+        if actor is None:
+            raise KeyError(name)
+        return actor
+
+
+class _ActorSnapshot:
+    ''' The actors of a model as they were when it was forked, for the new
+    model to copy as it needs them.
+
+    The original model keeps the snapshot valid: before it first changes,
+    removes or adds an actor after the fork, it stores a copy of the actor as
+    it was in `preserved` (or None, if there was no such actor).
+    '''
+
+    def __init__(self, model):
+        self.model = model
+        self.preserved = {}  # Actor name -> copy of the actor, or None
+
+    def peek(self, name):
+        ''' The actor with the given name at the time of the fork, or None.
+        It may be the original model's own actor, so it must not be modified.
+        '''
+        if name in self.preserved:
+            return self.preserved[name]
+        return self.model._peek(name)
+
+    def names(self):
+        ''' The names of the actors at the time of the fork, as a dictionary
+        of name -> None (not in the order of `all_actors`).
+        '''
+        names = self.model._actor_names()
+        for name, actor in self.preserved.items():
+            if actor is None:
+                names.pop(name, None)
+            else:
+                names[name] = None
+        return names
 
 
 class SmewModel:
     ''' A generative model that consists of Actors and Events.
     '''
 
-    def __init__(self, actors=None, events=None, grammar=None, verbose=True):
+    selection_modes = ("uniform", "reservoir", "weighted", "sample")
+    # Actors, relationships and indexes are copied in full once this many
+    # forks deep
+    max_fork_depth = 16
+
+    def __init__(self, actors=None, events=None, grammar=None, verbose=True,
+                 incremental=False, selection="uniform", sample_attempts=100,
+                 defer_narration=False, checkpoint_every=100,
+                 keep_history=True, seed=None, vectorized=True,
+                 relationship_store=RelationshipStore):
         ''' Creates a new narrative model object.
         Args:
-            actors: A list of Actor objects; the initial model actors.
+            actors: A list of Actor objects; the initial model actors. An
+                    actor can only be in one model at a time.
             events: A list of Event classes
             grammar: if not None, a Tracery grammar dictionary of symbols which
                      will be available to all event narrations.
             verbose: Whether event narration text will be printed as it occurs
                      (defualts to True)
+            incremental: If True, keep the set of valid events between steps
+                         and only re-check the candidates involving actors
+                         whose properties, tags or relationships changed.
+                         This assumes each event's `filter` only depends on
+                         the actors passed to it. (defaults to False)
+            selection: How the next event is chosen from the valid ones:
+                       "uniform" (the default) lists them all and picks one
+                       at random; "reservoir" picks one uniformly while
+                       streaming through them, without building the list;
+                       "weighted" streams through them too, picking each
+                       with probability proportional to its `get_weight`.
+                       "sample" draws random (event, actors) combinations and
+                       checks them one at a time, which is much faster when
+                       there are many actors and many valid events.
+            sample_attempts: With "sample" selection, how many invalid random
+                             draws to allow before falling back to checking
+                             every combination. (defaults to 100)
+            defer_narration: If True, narration isn't rendered as events
+                             happen. Instead, it is rendered when it is read
+                             from `text_history`, or all at once by
+                             `render_text()`. The text is the same as it would
+                             have been if it was rendered right away.
+                             (defaults to False)
+            checkpoint_every: `state_history` stores a full copy of the state
+                              this often, and only the changes since the
+                              previous state the rest of the time.
+                              (defaults to 100)
+            keep_history: If False, the model doesn't keep the record of the
+                          whole run: `generate` doesn't store states, and
+                          the event log (and so `text_history` and
+                          `event_history`) only holds the latest step. Use
+                          `iter_steps` or sinks to get the output instead.
+                          (defaults to True)
+            seed: If not None, the seed for the model's random number
+                  generator, `self.rng`. Otherwise, it is seeded from the
+                  `random` module, so `random.seed` still makes runs
+                  repeatable.
+            vectorized: If True, use the `vector_filter` of Event classes
+                        that have one, if NumPy is installed.
+                        (defaults to True)
+            relationship_store: The RelationshipStore class to keep the
+                                relationships in, e.g.
+                                smew.sparse.SparseRelationshipStore to be
+                                able to query the whole relationship graph.
+                                (defaults to RelationshipStore)
 
         '''
+        if selection not in self.selection_modes:
+            raise SmewException(f"Unknown selection mode {selection}")
+        if seed is None:
+            seed = random.getrandbits(64)
+        self.rng = random.Random(seed)
+        self.selection = selection
+        self.sample_attempts = sample_attempts
+        self.incremental = incremental
+        self.vectorized = vectorized
+        self.relationship_store = relationship_store
+        # Names of actors changed since the last candidate update, as an
+        # ordered set
+        self._dirty = {}
+        # SetIndex of Event class -> tuples of actor names it is valid for
+        self._candidates = None
+        # SetIndex of actor name -> (Event class, actor names) candidates
+        self._candidate_index = SetIndex()
         if not actors:
             actors = []
-        self.all_actors = actors
-        self.actors = {actor.name: actor for actor in self.all_actors}
+        for actor in actors:
+            self._check_free(actor)
+        for order, actor in enumerate(actors):
+            actor._order = order
+        self._actor_list = actors  # all_actors, or None until it's needed
+        self._actor_table = {actor.name: actor for actor in actors}
+        self._n_actors = len(actors)
+        self._next_order = len(actors)  # For the next actor added
+        # For a model made by `fork`: the _ActorSnapshot it copies actors from
+        # as they are looked up, the names of the actors removed from it
+        # since, and how many forks deep the snapshots go.
+        self._source = None
+        self._gone = set()
+        self._fork_depth = 0
+        # Snapshots of this model for its forks, once it has been forked
+        self._snapshots = None
+        self._probes = {}  # Event class -> reusable instance for filtering
+        self._tag_index = SetIndex()  # tag -> actor names
+        # Cached lists of each tag's actors, in the order of all_actors
+        self._tag_lists = {}
+        # Index of actors by property value, for the properties used in an
+        # Event's `same`: (property, value) -> actor names
+        self._group_index = SetIndex()
+        self._indexed_properties = set()
+        # Cached lists of the actors in each group, in the order of
+        # all_actors: (property, value) -> [actor]
+        self._group_lists = {}
+        self._join_specs = {}  # Event class -> parsed `same` constraints
+        # Changes since the last state stored in state_history, or None when
+        # they aren't being recorded.
+        self._changes = None
+        self._journal = None  # Undo entries, while a transaction is open
+        # The hash of the current state, once state_hash has been called
+        self._state_hash = None
+        self._transactions = []  # Stack of open _Transactions
+        for actor in actors:
+            self._attach_actor(actor)
 
         if not events:
             events = []
@@ -275,25 +751,79 @@ class SmewModel:
 
         if grammar is None:
             grammar = {}
+        # Event class -> (narrative, grammar version, merged rules)
+        self._narration_cache = {}
         self.grammar = grammar
 
-        self.relationships = []
+        self.relationships = relationship_store()
         self.ended = False
 
+        self.defer_narration = defer_narration
+        # Narration draws from its own random stream, so that it doesn't
+        # matter for the rest of the run whether (or when) text is rendered.
+        self._narration_rng = random.Random(self.rng.getrandbits(64))
+
         self.verbose = verbose
-        self.state_history = []
-        self.event_history = []
-        self.text_history = []
+        self.profiler = None  # A Profiler, while profiling is on
+        self.keep_history = keep_history
+        self.state_history = StateHistory(checkpoint_every)
+        self.event_log = EventLog()
+        self.step = 0  # Number of steps (calls to advance) run so far
+
+    @property
+    def text_history(self):
+        ''' All narration text so far, as a read-only sequence of strings.
+
+        Each piece of narration appears as it was narrated, followed by the
+        whole paragraph of the event once the event is done.
+        '''
+        return self.event_log.text_history
+
+    @property
+    def event_history(self):
+        ''' All the events that have happened so far, as a read-only sequence
+        of strings.
+        '''
+        return self.event_log.event_history
+
+    @property
+    def all_actors(self):
+        ''' List of the model's actors, in the order they were added.
+
+        In a model made by `fork`, this (like `actors`) copies every actor
+        that hasn't been copied from the original model yet.
+        '''
+        if self._actor_list is None:
+            self._copy_all_actors()
+        return self._actor_list
+
+    @property
+    def actors(self):
+        ''' Dictionary of the model's actors by name.
+        '''
+        if self._source is not None:
+            self._copy_all_actors()
+        return self._actor_table
 
     def add_actor(self, actor):
         '''
         Insert a new actor into the model.
         '''
 
-        if actor.name in self.actors:
+        if self._peek(actor.name) is not None:
             raise SmewException(f"An actor named {actor} is already in model.")
-        self.all_actors.append(actor)
-        self.actors[actor.name] = actor
+        self._check_free(actor)
+        if self._snapshots is not None:
+            self._preserve(actor.name, None)
+        actor._order = self._next_order
+        self._next_order += 1
+        self._list_actor(actor)
+        self._attach_actor(actor)
+        if self._journal is not None:
+            self._journal.append((_ACTOR_ADDED, actor))
+        if self._changes is not None:
+            self._changes.append((history.ADD_ACTOR, actor._to_state(),
+                                  self._n_actors - 1))
 
     def remove_actor(self, actor, remove_relationships=True):
         '''
@@ -304,16 +834,261 @@ class SmewModel:
             remove_relationships: if True, remove any relationship involving
                                   the actor as well
         '''
-        self.all_actors.remove(actor)
-        del self.actors[actor.name]
+        if self._actor_table.get(actor.name) is not actor:
+            raise ValueError(f"{actor} is not in the model")
+        if self._snapshots is not None:
+            self._preserve(actor.name, actor)
+        self._unlist_actor(actor)
+        self._detach_actor(actor)
+        if self._journal is not None:
+            self._journal.append((_ACTOR_REMOVED, actor))
+        if self._changes is not None:
+            self._changes.append((history.REMOVE_ACTOR, actor.name))
 
         if remove_relationships:
-            to_delete = []
-            for rel in self.relationships:
-                if rel[0] == actor.name or rel[2] == actor.name:
-                    to_delete.append(rel)
-            for rel in to_delete:
-                self.relationships.remove(rel)
+            for triple in self.relationships.remove_actor(actor.name):
+                self._relationship_changed(triple, False)
+
+    def _list_actor(self, actor):
+        ''' Put an actor into `all_actors` and `actors`, in its place.
+        '''
+        if self._actor_list is not None:
+            self._actor_list.insert(self._actor_position(actor._order), actor)
+        self._actor_table[actor.name] = actor
+        self._gone.discard(actor.name)
+        self._n_actors += 1
+
+    def _unlist_actor(self, actor):
+        ''' Take an actor out of `all_actors` and `actors`.
+        '''
+        if self._actor_list is not None:
+            del self._actor_list[self._actor_position(actor._order)]
+        del self._actor_table[actor.name]
+        if self._source is not None:
+            self._gone.add(actor.name)
+        self._n_actors -= 1
+
+    def _actor_position(self, order):
+        ''' The position in `all_actors` of the first actor whose `_order`
+        isn't less than `order`.
+        '''
+        actors = self._actor_list
+        low, high = 0, len(actors)
+        while low < high:
+            middle = (low + high) // 2
+            if actors[middle]._order < order:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    @staticmethod
+    def _check_free(actor):
+        ''' Make sure an actor isn't in a model already, since each model
+        keeps its own indexes of its actors.
+        '''
+        if actor._model is not None:
+            raise SmewException(f"{actor} is already in a model; each model "
+                                f"needs its own actors")
+
+    def _attach_actor(self, actor):
+        ''' Point an actor at this model and add it to the indexes.
+        '''
+        actor._model = self
+        for tag in actor._tags:
+            self._tag_index.add(tag, actor.name)
+            self._tag_lists.pop(tag, None)
+        for prop in self._indexed_properties:
+            self._index_property(actor, prop)
+        if self.incremental:
+            self._dirty[actor.name] = None
+        if self._state_hash is not None:
+            self._state_hash ^= self._hash_actor(actor)
+
+    def _detach_actor(self, actor):
+        ''' Remove an actor from the indexes and unlink it from this model.
+        '''
+        for tag in actor._tags:
+            self._tag_changed(actor, tag, False)
+        for prop in self._indexed_properties:
+            self._unindex_property(actor, prop, getattr(actor, prop))
+        if self._state_hash is not None:
+            self._state_hash ^= self._hash_actor(actor)
+        actor._model = None
+        if self.incremental:
+            self._dirty[actor.name] = None
+
+    def _tag_changed(self, actor, tag, added):
+        ''' Called by an Actor in this model when one of its tags changes.
+        '''
+        self._tag_lists.pop(tag, None)
+        if added:
+            self._tag_index.add(tag, actor.name)
+        else:
+            self._tag_index.discard(tag, actor.name)
+        if self.incremental:
+            self._dirty[actor.name] = None
+        if self._actor_table.get(actor.name) is actor:  # Not being removed
+            if self._changes is not None:
+                self._changes.append((history.TAGS, actor.name,
+                                      list(actor._tags)))
+            if self._state_hash is not None:
+                self._state_hash ^= feature_hash("tag", actor.name, tag)
+
+    def _actor_changed(self, actor, name, old_value):
+        ''' Called by an Actor in this model when an attribute is assigned.
+        '''
+        if old_value is _MISSING:
+            old_value = None
+        if name in self._indexed_properties:
+            self._unindex_property(actor, name, old_value)
+            self._index_property(actor, name)
+        if self.incremental:
+            self._dirty[actor.name] = None
+        if self._state_hash is not None:
+            if name in actor.properties:
+                self._state_hash ^= (
+                    feature_hash("property", actor.name, name, old_value) ^
+                    feature_hash("property", actor.name, name,
+                                 getattr(actor, name)))
+            elif name == "properties":
+                self._state_hash ^= (
+                    self._hash_properties(actor, old_value or ()) ^
+                    self._hash_properties(actor, actor.properties))
+        if self._changes is not None:
+            if name in actor.properties:
+                self._changes.append((history.SET, actor.name, name,
+                                      getattr(actor, name)))
+            elif name == "properties":
+                # The set of properties in the actor's state has changed
+                position = self.all_actors.index(actor)
+                self._changes.append((history.REMOVE_ACTOR, actor.name))
+                self._changes.append((history.ADD_ACTOR, actor._to_state(),
+                                      position))
+
+    def _index_property(self, actor, prop):
+        value = getattr(actor, prop)
+        try:
+            self._group_index.add((prop, value), actor.name)
+        except TypeError:
+            raise SmewException(f"Can't index {actor}'s {prop}: "
+                                f"{value!r} is not hashable")
+        self._group_lists.pop((prop, value), None)
+
+    def _unindex_property(self, actor, prop, value):
+        self._group_index.discard((prop, value), actor.name)
+        self._group_lists.pop((prop, value), None)
+
+    def _property_group(self, prop, value):
+        ''' All actors whose `prop` is equal to `value`, in the order of
+        `all_actors`, as a cached list that must not be modified.
+        '''
+        if prop not in self._indexed_properties:
+            self._indexed_properties.add(prop)
+            for actor in self.all_actors:
+                self._index_property(actor, prop)
+        group = self._group_lists.get((prop, value))
+        if group is None:
+            group = self._group_lists[(prop, value)] = self._sorted_actors(
+                self._group_index.members((prop, value)))
+        return group
+
+    def _sorted_actors(self, names):
+        ''' The actors with the given names, in the order of `all_actors`.
+        '''
+        actors = self._actor_table
+        return sorted([actors[name] for name in names], key=_actor_order)
+
+    def _relationship_changed(self, triple, added):
+        ''' Called whenever a relationship triple is added or removed.
+        '''
+        if self.incremental:
+            self._dirty[triple[0]] = None
+            self._dirty[triple[2]] = None
+        if self._changes is not None:
+            self._changes.append(
+                (history.RELATE if added else history.UNRELATE, triple))
+        if self._state_hash is not None:
+            self._state_hash ^= feature_hash("relationship", *triple)
+
+    # Copying actors into forked models
+    def _peek(self, name):
+        ''' The actor with the given name, or None, without copying it into
+        this model if it was forked from another one. It must not be
+        modified.
+        '''
+        actor = self._actor_table.get(name)
+        if (actor is None and self._source is not None and
+                name not in self._gone):
+            actor = self._source.peek(name)
+        return actor
+
+    def _actor_names(self):
+        ''' The names of the model's actors, as a dictionary of name -> None,
+        without copying any actors into it.
+        '''
+        names = dict.fromkeys(self._actor_table)
+        if self._source is not None:
+            for name in self._source.names():
+                if name not in self._gone:
+                    names[name] = None
+        return names
+
+    def _copy_actor(self, name):
+        ''' Copy the actor with the given name from the model this one was
+        forked from, the first time it is looked up.
+
+        Returns:
+            The copy, or None if there is no actor with that name.
+        '''
+        if self._source is None or name in self._gone:
+            return None
+        original = self._source.peek(name)
+        if original is None:
+            return None
+        actor = original._clone()
+        actor._model = self
+        self._actor_table[name] = actor
+        if len(self._actor_table) == self._n_actors:
+            self._drop_source()
+        return actor
+
+    def _copy_all_actors(self):
+        ''' Copy every actor that hasn't been copied into this model yet,
+        and list them in `all_actors`.
+        '''
+        if self._source is not None:
+            for name in self._source.names():
+                if self._source is None:
+                    break
+                if name not in self._gone and name not in self._actor_table:
+                    self._copy_actor(name)
+            if self._source is not None:
+                self._drop_source()
+        if self._actor_list is None:
+            self._actor_list = sorted(self._actor_table.values(),
+                                      key=_actor_order)
+
+    def _drop_source(self):
+        ''' Stop copying actors from the model this one was forked from, once
+        it has copied all of them.
+        '''
+        self._source = None
+        self._gone = set()
+        self._fork_depth = 0
+        self._actor_table = dict(self._actor_table)
+
+    def _preserve(self, name, actor):
+        ''' Called before an actor is changed or removed (or, with `actor`
+        None, before one with that name is added), so that the snapshots of
+        this model for its forks keep it as it was.
+        '''
+        copy = _MISSING
+        for snapshot in self._snapshots:
+            if name not in snapshot.preserved:
+                if copy is _MISSING:
+                    copy = None if actor is None else actor._clone()
+                snapshot.preserved[name] = copy
 
     def add_event(self, event):
         '''
@@ -325,6 +1100,7 @@ class SmewModel:
                 f"An event named {event.__name__} is already in the model.")
         self.all_events.append(event)
         self.events[event.__name__] = event
+        self._candidates = None
 
     def relate(self, a, relation, b, reciprocal=True):
         '''
@@ -337,8 +1113,8 @@ class SmewModel:
                         (a, relationship, b) and the other (b, relationship, a)
         '''
         relation_tuple = (a.name, relation, b.name)
-        if relation_tuple not in self.relationships:
-            self.relationships.append(relation_tuple)
+        if self.relationships.add(relation_tuple):
+            self._relationship_changed(relation_tuple, True)
         if reciprocal:
             self.relate(b, relation, a, False)
 
@@ -353,6 +1129,7 @@ class SmewModel:
         '''
         relation_tuple = (a.name, relation, b.name)
         self.relationships.remove(relation_tuple)
+        self._relationship_changed(relation_tuple, False)
         if reciprocal:
             self.unrelate(b, relation, a, False)
 
@@ -377,68 +1154,577 @@ class SmewModel:
         if isinstance(a, Actor) and isinstance(c, Actor):
             related = ((a.name, b, c.name) in self.relationships)
         elif type(a) is str and isinstance(b, Actor):
-            for triple in self.relationships:
-                if triple[1] == a and triple[2] == b.name:
-                    related.append(self.actors[triple[0]])
+            related = [self._actor_table[name]
+                       for name in self.relationships.subjects(a, b.name)]
         elif isinstance(a, Actor) and type(b) is str:
-            for triple in self.relationships:
-                if triple[0] == a.name and triple[1] == b:
-                    related.append(self.actors[triple[2]])
+            related = [self._actor_table[name]
+                       for name in self.relationships.objects(a.name, b)]
         return related
 
+    @property
+    def grammar(self):
+        ''' The Tracery grammar dictionary available to all event narrations.
+
+        Assigning a dictionary stores a copy of it, as a GrammarDict. Rules
+        are merged with each Event class's narrative once and reused until
+        the grammar changes, whether it is assigned again or modified in
+        place (e.g. `model.grammar["mood"] = [...]`).
+        '''
+        return self._grammar
+
+    @grammar.setter
+    def grammar(self, grammar):
+        if not isinstance(grammar, GrammarDict):
+            grammar = GrammarDict(grammar)
+        self._grammar = grammar
+        self._narration_cache = {}
+
+    def _narration_rules(self, event):
+        ''' Get the model grammar merged with an event's narrative rules.
+        '''
+        cached = self._narration_cache.get(type(event))
+        if (cached is None or cached[0] is not event.narrative or
+                cached[1] != self._grammar.version):
+            cached = (event.narrative, self._grammar.version,
+                      {**self._grammar, **event.grammar})
+            self._narration_cache[type(event)] = cached
+        return cached[2]
+
+    @property
+    def relationships(self):
+        ''' The model's RelationshipStore of (name, relation, name) triples.
+
+        Can be assigned any iterable of triples, which replaces the current
+        relationships.
+        '''
+        return self._relationships
+
+    @relationships.setter
+    def relationships(self, triples):
+        if not isinstance(triples, RelationshipStore):
+            triples = self.relationship_store(triples)
+        if self._state_hash is not None:
+            for triple in self._relationships:
+                self._state_hash ^= feature_hash("relationship", *triple)
+            for triple in triples:
+                self._state_hash ^= feature_hash("relationship", *triple)
+        self._relationships = triples
+        self._candidates = None
+        if self._changes is not None:
+            self._changes.append((history.RELATIONSHIPS, list(triples)))
+
     def get_tagged(self, tag):
         '''
-        Return a list of all actors with the given tag.
+        Return a list of all actors with the given tag, in the same order as
+        in `all_actors`.
+        '''
+        return list(self._tagged(tag))
+
+    def _tagged(self, tag):
+        ''' Like get_tagged, but returns a cached list that must not be
+        modified.
+        '''
+        tagged = self._tag_lists.get(tag)
+        if tagged is None:
+            tagged = self._tag_lists[tag] = self._sorted_actors(
+                self._tag_index.members(tag))
+        return tagged
+
+    def _actor_pools(self, AnEvent):
+        ''' The lists of actors that can fill each position of an event.
         '''
-        return [actor for actor in self.all_actors if actor.has_tag(tag)]
+        if AnEvent.match:
+            return [self._tagged(tag) for tag in AnEvent.match]
+        return [self.all_actors] * AnEvent.n_actors()
 
     def get_matching(self, AnEvent):
         '''
         Get all potential sets of actors to run the event filter against.
         '''
-        if AnEvent.match:
-            tagged_actors = [self.get_tagged(tag) for tag in AnEvent.match]
-            return [actors for actors in product(*tagged_actors)
-                    if len(set(actors)) == len(actors)]
+        if AnEvent.trigger_only:
+            return []
+        if self.profiler is not None:
+            return self.profiler.matching(AnEvent, self._get_matching(AnEvent))
+        return self._get_matching(AnEvent)
+
+    def _get_matching(self, AnEvent):
+        if (AnEvent.match or AnEvent.same or
+                self._has_prefix_filter(AnEvent)):
+            return self._combine(AnEvent, self._actor_pools(AnEvent))
         else:
             return permutations(self.all_actors, AnEvent.n_actors())
 
+    @staticmethod
+    def _has_prefix_filter(AnEvent):
+        return AnEvent.filter_prefix is not Event.filter_prefix
+
+    def _combine(self, AnEvent, pools):
+        ''' Generate every combination of distinct actors taking one from each
+        pool, pruning with the event's `filter_prefix` if it has one and only
+        generating combinations that satisfy its `same` constraints.
+        '''
+        joins = self._join_spec(AnEvent)
+        if not joins and not self._has_prefix_filter(AnEvent):
+            return (actors for actors in product(*pools)
+                    if len(set(actors)) == len(actors))
+        filter_prefix = None
+        if self._has_prefix_filter(AnEvent):
+            filter_prefix = self._probe(AnEvent).filter_prefix
+        return self._combine_pruned(AnEvent, pools, joins, filter_prefix)
+
+    def _combine_pruned(self, AnEvent, pools, joins, filter_prefix,
+                        prefix=()):
+        position = len(prefix)
+        last = (position == len(pools) - 1)
+        for actor in self._position_pool(AnEvent, pools, joins, prefix):
+            if actor in prefix:
+                continue
+            actors = prefix + (actor,)
+            if last:
+                yield actors
+            elif filter_prefix is None or filter_prefix(*actors):
+                yield from self._combine_pruned(AnEvent, pools, joins,
+                                                filter_prefix, actors)
+
+    def _position_pool(self, AnEvent, pools, joins, prefix):
+        ''' The actors that can fill the next position after `prefix`, given
+        the event's `same` constraints.
+
+        A position counts as already filled if it is in the prefix, or if its
+        pool has only one actor in it. The actors are in the same order as in
+        the position's pool, whether or not they come from an index.
+        '''
+        position = len(prefix)
+        pool = pools[position]
+        conditions = []
+        for prop, others in joins.get(position, ()):
+            for other in others:
+                if other < position:
+                    bound = prefix[other]
+                elif len(pools[other]) == 1:
+                    bound = pools[other][0]
+                else:
+                    continue
+                conditions.append((prop, getattr(bound, prop)))
+                break
+        if not conditions:
+            return pool
+
+        group = self._property_group(*conditions[0])
+        if len(group) < len(pool):
+            tag = AnEvent.match[position] if AnEvent.match else None
+            pool = [actor for actor in group
+                    if tag is None or actor.has_tag(tag)]
+            conditions = conditions[1:]
+        if conditions:
+            pool = [actor for actor in pool
+                    if all(getattr(actor, prop) == value
+                           for prop, value in conditions)]
+        return pool
+
+    def _join_spec(self, AnEvent):
+        ''' Parse an Event class's `same` into a dictionary of
+        position -> [(property, [other positions sharing it])]
+        '''
+        spec = self._join_specs.get(AnEvent)
+        if spec is None:
+            spec = {}
+            for prop, positions in (AnEvent.same or {}).items():
+                for position in positions:
+                    others = [other for other in positions
+                              if other != position]
+                    spec.setdefault(position, []).append((prop, others))
+            self._join_specs[AnEvent] = spec
+        return spec
+
+    def _joins_pass(self, AnEvent, actors):
+        ''' Check a complete combination of actors against `same`.
+        '''
+        for prop, positions in (AnEvent.same or {}).items():
+            value = getattr(actors[positions[0]], prop)
+            if any(getattr(actors[i], prop) != value for i in positions[1:]):
+                return False
+        return True
+
+    def _prefixes_pass(self, AnEvent, actors):
+        ''' Check every partial combination of `actors` with `filter_prefix`.
+        '''
+        if not self._has_prefix_filter(AnEvent):
+            return True
+        filter_prefix = self._probe(AnEvent).filter_prefix
+        return all(filter_prefix(*actors[:i]) for i in range(1, len(actors)))
+
+    def iter_candidates(self):
+        ''' Generate all valid events that can happen next, as Candidates.
+
+        Filters are checked without instantiating the Event classes; use
+        `Candidate.instantiate` to get an Event that can be run. The model
+        shouldn't be changed while the generator is being consumed.
+        '''
+        if self.incremental:
+            self._update_candidates()
+            lookup = self._actor_table.__getitem__
+            for AnEvent in self.all_events:
+                for names in self._candidates.members(AnEvent):
+                    yield Candidate(AnEvent, tuple(map(lookup, names)))
+            return
+
+        for AnEvent in self.all_events:
+            passing = self._vector_matching(AnEvent)
+            if passing is not None:
+                for actors in passing:
+                    yield Candidate(AnEvent, actors)
+                continue
+            event_filter = self._probe(AnEvent).filter
+            for actors in self.get_matching(AnEvent):
+                if event_filter(*actors):
+                    yield Candidate(AnEvent, actors)
+
     def get_possible_events(self):
         ''' Find the list of all valid instantiated events that can happen next.
         '''
-        possible_events = []
+        return [candidate.instantiate(self)
+                for candidate in self.iter_candidates()]
+
+    def _vector_matching(self, AnEvent):
+        ''' Find every combination of actors that passes an event's filter,
+        using its `vector_filter`.
+
+        Returns:
+            An iterator of actor tuples; or None if the event doesn't have a
+            `vector_filter` (or NumPy isn't installed, or vectorizing is
+            turned off, or there are too few combinations to be worth it),
+            and its combinations should be checked one at a time instead.
+        '''
+        if (vectorized is None or not self.vectorized or
+                AnEvent.vector_filter is None or AnEvent.trigger_only):
+            return None
+        pools = self._actor_pools(AnEvent)
+        size = 1
+        for pool in pools:
+            size *= len(pool)
+        if size < vectorized.MIN_VECTOR_SIZE:
+            return None
+        args = (self._probe(AnEvent), pools, self._join_spec(AnEvent))
+        if self.profiler is None:
+            return vectorized.vector_matching(*args)
+        mask = self.profiler.call("filter", AnEvent, vectorized.vector_mask,
+                                  *args)
+        self.profiler.count_filtered(AnEvent, mask.size, int(mask.sum()))
+        return vectorized.masked_combinations(pools, mask)
+
+    def _probe(self, AnEvent):
+        ''' Get a reusable instance of an Event class to call `filter` on.
+        '''
+        probe = self._probes.get(AnEvent)
+        if probe is None:
+            probe = self._probes[AnEvent] = AnEvent(self)
+            if self.profiler is not None:
+                self.profiler.wrap_filter(probe)
+        return probe
+
+    # Incremental candidate maintenance
+    def _update_candidates(self):
+        ''' Bring the stored set of valid events up to date.
+
+        The first time this is called (or after the events or relationships
+        are replaced wholesale) every candidate is checked. After that, only
+        the candidates involving an actor in `self._dirty` are re-checked.
+        '''
+        if self._candidates is None:
+            self._candidates = SetIndex()
+            self._candidate_index = SetIndex()
+            self._dirty = {}
+            for AnEvent in self.all_events:
+                passing = self._vector_matching(AnEvent)
+                if passing is not None:
+                    for actors in passing:
+                        self._add_candidate(AnEvent, actors)
+                    continue
+                probe = self._probe(AnEvent)
+                for actors in self.get_matching(AnEvent):
+                    if probe.filter(*actors):
+                        self._add_candidate(AnEvent, actors)
+            return
+
+        dirty, self._dirty = self._dirty, {}
+        for name in dirty:
+            for AnEvent, names in self._candidate_index.pop(name):
+                self._discard_candidate(AnEvent, names)
+        dirty = [actor for actor in map(self._get_actor, dirty)
+                 if actor is not None]
+        if not dirty:
+            return
+
         for AnEvent in self.all_events:
+            probe = self._probe(AnEvent)
+            checked = set()
+            for actors in self._matching_involving(AnEvent, dirty):
+                if actors in checked:
+                    continue
+                checked.add(actors)
+                if probe.filter(*actors):
+                    self._add_candidate(AnEvent, actors)
+
+    def _matching_involving(self, AnEvent, changed):
+        ''' Like get_matching, but only the actor sets including at least one
+        of the `changed` actors. May yield the same actor set more than once.
+        '''
+        if AnEvent.trigger_only:
+            return
+        if self.profiler is not None:
+            yield from self.profiler.matching(
+                AnEvent, self._get_matching_involving(AnEvent, changed))
+        else:
+            yield from self._get_matching_involving(AnEvent, changed)
 
-            for actors in self.get_matching(AnEvent):
-                event = AnEvent(self, *actors)
-                if event.filter(*actors):
-                    possible_events.append(event)
-        return possible_events
+    def _get_matching_involving(self, AnEvent, changed):
+        pools = self._actor_pools(AnEvent)
+        if AnEvent.match:
+            fits = [lambda actor, tag=tag: actor.has_tag(tag)
+                    for tag in AnEvent.match]
+        else:
+            fits = [lambda actor: True] * len(pools)
+
+        for actor in changed:
+            for i, fit in enumerate(fits):
+                if not fit(actor):
+                    continue
+                these_pools = pools[:i] + [[actor]] + pools[i+1:]
+                yield from self._combine(AnEvent, these_pools)
+
+    def _add_candidate(self, AnEvent, actors):
+        names = tuple(actor.name for actor in actors)
+        if self._candidates.add(AnEvent, names):
+            for name in names:
+                self._candidate_index.add(name, (AnEvent, names))
+
+    def _discard_candidate(self, AnEvent, names):
+        self._candidates.discard(AnEvent, names)
+        for name in names:
+            self._candidate_index.discard(name, (AnEvent, names))
+
+    def _get_actor(self, name):
+        ''' The actor with the given name, or None.
+        '''
+        try:
+            return self._actor_table[name]
+        except KeyError:
+            return None
 
     def advance(self):
         if self.ended:
             return
-        possible_events = self.get_possible_events()
-        if len(possible_events) == 0:
+        if not self.keep_history:
+            self.event_log.clear()
+        if self.selection == "sample":
+            candidate = self.sample_candidate()
+        else:
+            candidate = self.select_candidate(self.iter_candidates())
+        if candidate is None:
             self.ended = True
             return
-        event = random.choice(possible_events)
+        self.run_candidate(candidate)
+
+    def run_candidate(self, candidate):
+        ''' Run a chosen event as the model's next step.
+
+        Args:
+            candidate: A Candidate, e.g. from iter_candidates.
+
+        Returns:
+            The Event that was run.
+        '''
+        event = candidate.instantiate(self)
         event.run()
+        self.step += 1
+        return event
+
+    def select_candidate(self, candidates):
+        ''' Choose the next event out of the valid ones.
+
+        Args:
+            candidates: An iterable of Candidates, e.g. from iter_candidates.
 
-    def generate(self, max_steps=100, store_states=True):
+        Returns:
+            One Candidate, chosen according to `self.selection`; or None if
+            there are no candidates.
+        '''
+        if self.selection == "uniform":
+            candidates = list(candidates)
+            if len(candidates) == 0:
+                return None
+            return self.rng.choice(candidates)
+        return self._reservoir_sample(candidates,
+                                      self.selection == "weighted")
+
+    def _reservoir_sample(self, candidates, weighted=False):
+        ''' Choose one candidate while streaming through them.
+
+        Each candidate replaces the current choice with probability
+        weight / (total weight so far), which leaves every candidate equally
+        likely to be chosen (or proportional to its weight, if `weighted`).
+        '''
+        chosen = None
+        total = 0
+        for candidate in candidates:
+            if weighted:
+                weight = (self._probe(candidate.event_class)
+                          .get_weight(*candidate.actors))
+                if weight <= 0:
+                    continue
+            else:
+                weight = 1
+            total += weight
+            if self.rng.random() * total < weight:
+                chosen = candidate
+        return chosen
+
+    def sample_candidate(self):
+        ''' Choose the next event by sampling random combinations first.
+
+        Draws an (event class, actors) combination uniformly from all the
+        combinations get_matching would produce, and returns it if it passes
+        the filter. After `self.sample_attempts` failed draws, falls back to
+        streaming through every valid event, so the result is still uniform
+        over all valid events, and None is only returned if there are none.
+        '''
+        spaces = []
+        total = 0
+        for AnEvent in self.all_events:
+            if AnEvent.trigger_only:
+                continue
+            pools = self._actor_pools(AnEvent)
+            size = 1
+            for pool in pools:
+                size *= len(pool)
+            if size > 0:
+                total += size
+                spaces.append((total, AnEvent, pools))
+
+        if total > 0:
+            for _ in range(self.sample_attempts):
+                draw = self.rng.random() * total
+                for cumulative, AnEvent, pools in spaces:
+                    if draw < cumulative:
+                        break
+                actors = tuple(self.rng.choice(pool) for pool in pools)
+                if (len(set(actors)) == len(actors) and
+                        self._joins_pass(AnEvent, actors) and
+                        self._prefixes_pass(AnEvent, actors) and
+                        self._probe(AnEvent).filter(*actors)):
+                    return Candidate(AnEvent, actors)
+
+        return self._reservoir_sample(self.iter_candidates())
+
+    def generate(self, max_steps=100, store_states=True, sinks=None,
+                 on_repeat=None):
         '''
         Run the model until it ends (or to the maximum number of steps)
 
         Args:
             max_steps: Maximum number of steps to run the model for
             store_states: If True, store all the states in `self.state_history`
+                          (unless the model's `keep_history` is False)
+            sinks: If not None, a list of Sinks to write a StepRecord to after
+                   every step. They are flushed, but not closed, at the end.
+            on_repeat: What to do when the model returns to a state it was
+                       already in during this run (as found by `state_hash`):
+                       "stop" ends the run (without setting `self.ended`),
+                       "warn" issues a warning, and a function is called
+                       with the model, the step number, and the step number
+                       the state was first seen at. By default, repeats
+                       aren't checked for.
+        '''
+        store_states = store_states and self.keep_history
+        if not store_states:
+            self._changes = None
+        sinks = sinks or []
+        with_states = any(sink.states for sink in sinks)
+        if on_repeat is not None:
+            seen = {self.state_hash(): self.step}
+        try:
+            steps = 0
+            while not self.ended and steps < max_steps:
+                step = self.step
+                self.advance()
+                steps += 1
+                if store_states:
+                    self._store_state()
+                if sinks and self.step != step:
+                    record = self._step_record(step, with_states)
+                    for sink in sinks:
+                        sink.write(record)
+                if on_repeat is not None and self.step != step:
+                    first = seen.setdefault(self.state_hash(), self.step)
+                    if first != self.step:
+                        if on_repeat == "stop":
+                            break
+                        elif on_repeat == "warn":
+                            warnings.warn(
+                                f"The state after step {self.step} repeats "
+                                f"the state after step {first}")
+                        else:
+                            on_repeat(self, self.step, first)
+        finally:
+            # Changes are only recorded between states stored by this run;
+            # the next one starts from a full state.
+            self._changes = None
+        for sink in sinks:
+            sink.flush()
+
+    def iter_steps(self, max_steps=None, states=False):
+        ''' Run the model one step at a time, yielding what happened.
+
+        Stops when the model ends, or after `max_steps` steps if it isn't
+        None. Doesn't store anything in `state_history`.
+
+        Args:
+            max_steps: Maximum number of steps to run the model for.
+            states: If True, include the model state after each step in the
+                    records.
+
+        Yields:
+            A StepRecord for each step.
         '''
         steps = 0
-        while not self.ended and steps < max_steps:
+        while not self.ended and (max_steps is None or steps < max_steps):
+            step = self.step
             self.advance()
             steps += 1
-            if store_states:
-                self.state_history.append(self.to_state())
+            if self.step == step:
+                return  # No event was possible
+            yield self._step_record(step, states)
+
+    def _step_record(self, step, with_state=False):
+        return StepRecord(step, self.event_log.at_step(step),
+                          self.to_state() if with_state else None)
+
+    def _store_state(self):
+        ''' Add the current state to `self.state_history`.
+
+        Stores a full state if one is due (or if changes haven't been recorded
+        since the last one), and otherwise just the changes since the last.
+        '''
+        if self._changes is None or self.state_history.needs_checkpoint():
+            self.state_history.append(self.to_state(), self.step)
+        else:
+            self.state_history.append_changes(self._changes, self.step)
+        self._changes = []
+
+    def state_at(self, step):
+        ''' Get the model state stored in `state_history` after a given step.
+
+        Args:
+            step: The number of steps that had been run.
+
+        Returns:
+            A state dictionary, as from `to_state`.
+        '''
+        try:
+            return self.state_history.at_step(step)
+        except KeyError:
+            raise SmewException(f"No state was stored for step {step}")
     
     def debug_advance(self):
         ''' Gets a data structure with all events and start and end states.
@@ -450,20 +1736,240 @@ class SmewModel:
             debug_data["ended"] = True
             return debug_data
 
-        possible_events = self.get_possible_events()
-        debug_data["possible_events"] = [str(event) for 
-                                         event in possible_events]
-        if len(possible_events) == 0:
+        candidates = list(self.iter_candidates())
+        debug_data["possible_events"] = [
+            str(candidate.instantiate(self))
+            if _has_own_str(candidate.event_class) else str(candidate)
+            for candidate in candidates]
+        if len(candidates) == 0:
             self.ended = True
             debug_data["ended"] = True
             return debug_data
-        event = random.choice(possible_events)
+        event = self.select_candidate(candidates).instantiate(self)
         debug_data["chosen_event"] = str(event)
         event.run()
+        self.step += 1
         debug_data["event_text"] = self.text_history[-1]
         debug_data["end_state"] = self.to_state()
         return debug_data
     
+    def render_text(self, processes=None):
+        ''' Render any deferred narration in `text_history` to strings.
+
+        Args:
+            processes: If not None, the number of worker processes to render
+                       the text with.
+        '''
+        self.event_log.render(processes)
+
+    # Profiling
+    def start_profiling(self, profiler=None):
+        ''' Start recording how much time the model spends on each Event
+        class, and in which phase.
+
+        While profiling is off, the model only has to check that it is off
+        before running, filtering, narrating and enumerating events.
+
+        Args:
+            profiler: If not None, a Profiler to add the statistics to.
+
+        Returns:
+            The Profiler; see its `report()`, or print it for a table.
+        '''
+        if profiler is None:
+            profiler = Profiler()
+        self.profiler = profiler
+        for probe in self._probes.values():
+            profiler.wrap_filter(probe)
+        return profiler
+
+    def stop_profiling(self):
+        ''' Stop recording profiling statistics.
+
+        Returns:
+            The Profiler that was in use, or None.
+        '''
+        for probe in self._probes.values():
+            probe.__dict__.pop("filter", None)
+        profiler, self.profiler = self.profiler, None
+        return profiler
+
+    # State hashing
+    def state_hash(self):
+        ''' A 64-bit hash of the model's current state.
+
+        Models with the same actors (with the same names, tags and property
+        values) and the same relationships have the same hash, whatever order
+        they are in, and in any Python process. Different states have
+        different hashes, except by (very unlikely) coincidence.
+
+        The first call looks at the whole state. After that, the hash is kept
+        up to date as the model changes, at the cost of a little work for
+        each change. Like `state_history`, it only sees property changes made
+        by assigning to the property.
+        '''
+        if self._state_hash is None:
+            state_hash = 0
+            for actor in self.all_actors:
+                state_hash ^= self._hash_actor(actor)
+            for triple in self._relationships:
+                state_hash ^= feature_hash("relationship", *triple)
+            self._state_hash = state_hash
+        return self._state_hash
+
+    def _hash_actor(self, actor):
+        ''' The combined hash of an actor's features.
+        '''
+        actor_hash = feature_hash("actor", actor.name)
+        actor_hash ^= self._hash_properties(actor, actor.properties)
+        for tag in actor._tags:
+            actor_hash ^= feature_hash("tag", actor.name, tag)
+        return actor_hash
+
+    @staticmethod
+    def _hash_properties(actor, properties):
+        ''' The combined hash of the current values of some of an actor's
+        properties.
+        '''
+        properties_hash = 0
+        for prop in properties:
+            properties_hash ^= feature_hash("property", actor.name, prop,
+                                            getattr(actor, prop))
+        return properties_hash
+
+    # Transactions
+    def begin(self):
+        ''' Start a transaction: a set of changes that can be undone.
+
+        From now on, every change to the actors' attributes and tags, every
+        actor added or removed, and every relationship created or removed is
+        recorded, until `commit` or `rollback` is called. Undoing them only
+        takes time proportional to the number of changes. Transactions can
+        be nested; each `commit` or `rollback` ends the latest one.
+        '''
+        if self._journal is None:
+            self._journal = []
+        # Relationship changes go in a layer over the current relationships,
+        # which is merged into them or thrown away at the end.
+        relationships = self._relationships.layer()
+        self._relationships = relationships
+        # So do changes to the valid events of an incremental model, so that
+        # rolling back restores them in the same order.
+        candidates = candidate_index = dirty = None
+        if self._candidates is not None:
+            candidates = self._candidates = self._candidates.layer()
+            candidate_index = self._candidate_index = \
+                self._candidate_index.layer()
+            dirty = dict(self._dirty)
+        changes = self._changes
+        self._transactions.append(_Transaction(
+            len(self._journal), relationships, len(self.event_log),
+            len(self.event_log.fragments), len(self.state_history), changes,
+            0 if changes is None else len(changes), self.step, self.ended,
+            self.rng.getstate(), self._narration_rng.getstate(),
+            len(self.all_events), candidates, candidate_index, dirty))
+
+    def commit(self):
+        ''' End the latest transaction, keeping its changes.
+
+        If it is nested inside another transaction, its changes can still be
+        undone by rolling back the outer one.
+        '''
+        if not self._transactions:
+            raise SmewException("There is no transaction to commit")
+        transaction = self._transactions.pop()
+        if self._relationships is transaction.relationships:
+            self._relationships = transaction.relationships.merge()
+        if self._candidates is not None and \
+                self._candidates is transaction.candidates:
+            self._candidates = transaction.candidates.merge()
+            self._candidate_index = transaction.candidate_index.merge()
+        if not self._transactions:
+            self._journal = None
+
+    def rollback(self):
+        ''' End the latest transaction, undoing all of its changes.
+
+        The actors, relationships, event log, state history, step count and
+        random number generators are all returned to how they were when
+        `begin` was called, and the possible events are listed in the same
+        order again. (Events or grammar added to the model in the meantime
+        are kept, though.)
+        '''
+        if not self._transactions:
+            raise SmewException("There is no transaction to roll back")
+        transaction = self._transactions.pop()
+        journal, self._journal = self._journal, None
+        while len(journal) > transaction.journal_length:
+            self._undo(journal.pop())
+        if self._transactions:
+            self._journal = journal
+
+        relationships = transaction.relationships
+        if self._relationships is relationships:
+            for triple in relationships._triples:
+                self._relationship_changed(triple, False)
+            for triple in relationships._removed:
+                self._relationship_changed(triple, True)
+        else:  # They were replaced entirely
+            self._candidates = None
+            self._state_hash = None
+        self._relationships = relationships._base
+
+        if self.keep_history:
+            self.event_log.truncate(transaction.events,
+                                    transaction.fragments)
+        else:
+            self.event_log.clear()
+        self.state_history.truncate(transaction.states)
+        if self._changes is not None and \
+                self._changes is transaction.changes:
+            del self._changes[transaction.changes_length:]
+        else:
+            self._changes = None
+        self.step = transaction.step
+        self.ended = transaction.ended
+        self.rng.setstate(transaction.rng)
+        self._narration_rng.setstate(transaction.narration_rng)
+
+        # The valid events (and the actors left to re-check) are exactly as
+        # they were, unless there are new Event classes to find them for.
+        if transaction.candidates is not None and \
+                len(self.all_events) == transaction.n_events:
+            self._candidates = transaction.candidates._base
+            self._candidate_index = transaction.candidate_index._base
+            self._dirty = transaction.dirty
+        else:
+            self._candidates = None
+
+    def _undo(self, entry):
+        ''' Reverse one change recorded in the transaction journal.
+        '''
+        kind, actor = entry[0], entry[1]
+        if kind == _SET:
+            name, value = entry[2], entry[3]
+            current = getattr(actor, name)
+            if value is _MISSING:
+                object.__delattr__(actor, name)
+            else:
+                object.__setattr__(actor, name, value)
+            self._actor_changed(actor, name, current)
+        elif kind == _TAG_ADDED:
+            tags = actor._tags
+            position = tags.index(entry[2])
+            actor._tags = tags[:position] + tags[position + 1:]
+            self._tag_changed(actor, entry[2], False)
+        elif kind == _TAG_REMOVED:
+            tags, position = actor._tags, entry[3]
+            actor._tags = tags[:position] + (entry[2],) + tags[position:]
+            self._tag_changed(actor, entry[2], True)
+        elif kind == _ACTOR_ADDED:
+            self._unlist_actor(actor)
+            self._detach_actor(actor)
+        elif kind == _ACTOR_REMOVED:
+            self._list_actor(actor)
+            self._attach_actor(actor)
+
     # State storage and retrieval
     def to_state(self):
         ''' Generates a static dictionary of the current model state.
@@ -476,6 +1982,11 @@ class SmewModel:
             }
             Note that this is the model state only, and does not include events
         '''
+        if self.profiler is not None:
+            return self.profiler.call("to_state", None, self._to_state)
+        return self._to_state()
+
+    def _to_state(self):
 
         full_state = {}
         full_state["Actors"] = [actor._to_state() for actor in self.all_actors]
@@ -483,7 +1994,8 @@ class SmewModel:
         return full_state
     
     @classmethod
-    def from_state(cls, state, events=None, grammar=None, verbose=True):
+    def from_state(cls, state, events=None, grammar=None, verbose=True,
+                   schema=None, **options):
         ''' Instantiates a new SmewModel with a given starting state.
 
         Args:
@@ -494,11 +2006,148 @@ class SmewModel:
                      will be available to all event narrations.
             verbose: Whether event narration text will be printed as it occurs
                      (defualts to True)
+            schema: If not None, store the actors compactly, as instances of
+                    `Actor.with_schema(schema)`: either a list of property
+                    names, or True to use every property name in the state.
+                    Actors whose state doesn't have one of the properties get
+                    it with a value of None.
+            **options: Any other SmewModel keyword arguments (e.g.
+                       `incremental`, or `seed` to make the run repeatable).
+        '''
+        actor_class = Actor
+        if schema is True:
+            schema = {}
+            for actor in state["Actors"]:
+                schema.update(dict.fromkeys(actor["properties"]))
+        if schema is not None:
+            actor_class = Actor.with_schema(schema)
+        actors = [actor_class.from_state(actor) for actor in state["Actors"]]
+        model = cls(actors, events, grammar, verbose, **options)
+        model.relationships = state["Relationships"]
+        return model
+
+    def fork(self, seed=None, verbose=None):
+        ''' Create a copy of the model that can be run separately from it.
+
+        The copy starts with the same actors, relationships, events and
+        options (and its own copy of the grammar), at the same step. Making it takes about the same time
+        however many actors there are: the relationships and indexes are
+        shared between the two models until one of them changes them (and
+        then only the changes are stored), and the copy only copies each
+        actor from the original when it first looks it up, while the original
+        keeps a copy of each actor it changes from before the change. Reading
+        the copy's `all_actors` or `actors` copies all of them at once.
+
+        Each copy of an actor is a shallow copy, sharing the values of its
+        properties with the original. Property values that are changed in
+        place (e.g. by appending to a list) are therefore changed in both
+        models; assign a new value instead.
+
+        The copy's event log and state history start out empty.
+
+        Args:
+            seed: If not None, a new seed for the copy's random number
+                  generator. Otherwise the copy continues the same random
+                  sequence as the original, so it makes the same choices the
+                  original would have.
+            verbose: If not None, whether the copy prints its narration;
+                     otherwise the same as the original.
+
+        Returns:
+            A new SmewModel.
         '''
-        actors = [Actor.from_state(actor) for actor in state["Actors"]]
-        model = cls(actors, events, grammar, verbose)
-        model.relationships = list(state["Relationships"])
+        if self._transactions:
+            raise SmewException("Can't fork a model during a transaction")
+        if self.incremental and self._candidates is not None:
+            # Bring the valid events up to date, to share them rather than
+            # re-checking them all.
+            self._update_candidates()
+        if self._fork_depth >= self.max_fork_depth:
+            self._copy_all_actors()
+        model = type(self)(
+            None, list(self.all_events), GrammarDict(self.grammar),
+            self.verbose if verbose is None else verbose,
+            incremental=self.incremental, selection=self.selection,
+            sample_attempts=self.sample_attempts,
+            defer_narration=self.defer_narration,
+            checkpoint_every=self.state_history.checkpoint_every,
+            keep_history=self.keep_history, seed=0,
+            vectorized=self.vectorized,
+            relationship_store=self.relationship_store)
+        model.ended = self.ended
+        model.step = self.step
+        if seed is None:
+            model.rng.setstate(self.rng.getstate())
+            model._narration_rng.setstate(self._narration_rng.getstate())
+        else:
+            model.rng.seed(seed)
+            model._narration_rng.seed(model.rng.getrandbits(64))
+
+        # The copy takes its actors from a snapshot of this model's as they
+        # are looked up, and this model fills the snapshot in as it changes.
+        snapshot = _ActorSnapshot(self)
+        if self._snapshots is None:
+            self._snapshots = weakref.WeakSet()
+        self._snapshots.add(snapshot)
+        model._source = snapshot
+        model._fork_depth = self._fork_depth + 1
+        model._actor_table = _ActorTable(model)
+        model._actor_list = None
+        model._n_actors = self._n_actors
+        model._next_order = self._next_order
+        model._state_hash = self._state_hash
+
+        # Freeze the current relationships and indexes as shared bases, and
+        # layer separate ones for this model and the copy over them. The
+        # copy's indexes are in the same order as this model's, so it goes
+        # through the possible events in the same order too.
+        for name in ("_relationships", "_tag_index", "_group_index",
+                     "_candidates", "_candidate_index"):
+            base = getattr(self, name)
+            if base is None:
+                continue
+            if (isinstance(base, (LayeredRelationshipStore, LayeredSetIndex))
+                    and not base.changed):
+                base = base._base
+            elif base.depth >= self.max_fork_depth:
+                base = base.flattened()
+            setattr(self, name, base.layer())
+            setattr(model, name, base.layer())
+        model._indexed_properties = set(self._indexed_properties)
         return model
 
+class Candidate(namedtuple("Candidate", ["event_class", "actors"])):
+    ''' A valid event that can happen next, before it is instantiated.
+
+    Candidates are plain (event class, actor tuple) records; they print the
+    same way as the Event they describe, unless its class has its own
+    `__str__` or `__repr__`.
+    '''
+    __slots__ = ()
+
+    def __repr__(self):
+        return f"{self.event_class.__name__}{tuple(self.actors)}"
+
+    def instantiate(self, model):
+        ''' Create the Event object for this candidate in the given model.
+
+        The candidate may come from another model (e.g. the one `model` was
+        forked from); its actors are then replaced by the actors of `model`
+        with the same names.
+        '''
+        actors = self.actors
+        if any(actor._model is not model for actor in actors):
+            actors = [model._actor_table[actor.name] for actor in actors]
+        return self.event_class(model, *actors)
+
+
+def _has_own_str(event_class):
+    ''' Whether an Event class describes its events in its own way, rather
+    than by its name and actors.
+    '''
+    return (event_class.__str__ is not object.__str__ or
+            event_class.__repr__ is not Event.__repr__)
+
+
 class SmewException(Exception):
     pass
@@ -0,0 +1,210 @@
+'''
+Relationship stores that can answer questions about the whole relationship
+graph at once, using SciPy sparse matrices.
+
+Requires NumPy and SciPy. Use them by creating the model with
+`SmewModel(..., relationship_store=SparseRelationshipStore)`.
+'''
+
+import numpy
+import scipy.sparse
+
+from .relationships import LayeredRelationshipStore, RelationshipStore
+
+
+class ActorIds:
+    ''' Integer ids for actor names, for the rows and columns of adjacency
+    matrices.
+
+    Ids are given out in order as names first appear in a relationship, and
+    are never reused, even after every relationship involving an actor is
+    removed. Stores layered over each other (or copied from each other) share
+    the same ids.
+    '''
+
+    def __init__(self):
+        self.ids = {}  # Name -> id
+        self.names = []  # Id -> name
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name):
+        ''' Get the id of a name, giving it a new one if it doesn't have one.
+        '''
+        actor_id = self.ids.get(name)
+        if actor_id is None:
+            actor_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return actor_id
+
+
+class SparseQueries:
+    ''' Queries over a whole relationship graph, for relationship stores that
+    can give the adjacency matrix of each relation.
+
+    Every matrix and vector is indexed by actor id: use `names` to turn ids
+    into actor names, or `actor_id` to go the other way. Matrices are
+    square, with a row and column for every actor that has ever been in a
+    relationship in the store, and must not be modified.
+    '''
+
+    @property
+    def names(self):
+        ''' List of the actor name for each id.
+        '''
+        return list(self.actor_ids.names)
+
+    def actor_id(self, name):
+        ''' The id of an actor name, or None if it has never been in a
+        relationship in this store.
+        '''
+        return self.actor_ids.ids.get(name)
+
+    def matrix(self, relation):
+        ''' The adjacency matrix of a relation: a boolean scipy.sparse
+        csr_array with [i, j] True if actor i has the relation to actor j.
+        '''
+        size = len(self.actor_ids)
+        matrix = self._matrices.get(relation)
+        if matrix is None or matrix.shape[0] != size:
+            rows, columns = [], []
+            for row, column in self._coordinates(relation):
+                rows.append(row)
+                columns.append(column)
+            matrix = scipy.sparse.csr_array(
+                (numpy.ones(len(rows), dtype=bool), (rows, columns)),
+                shape=(size, size))
+            self._matrices[relation] = matrix
+        return matrix
+
+    def out_degree(self, relation):
+        ''' Array of how many actors each actor has the relation to.
+        '''
+        return numpy.asarray(self.matrix(relation).sum(axis=1)).ravel()
+
+    def in_degree(self, relation):
+        ''' Array of how many actors have the relation to each actor.
+        '''
+        return numpy.asarray(self.matrix(relation).sum(axis=0)).ravel()
+
+    def mutual(self, relation, inverse=None):
+        ''' Boolean matrix of the pairs of actors where the first has the
+        relation to the second, and the second has the `inverse` relation
+        (the same relation, if None) back to the first.
+
+        E.g. `mutual("loves", "hates").sum(axis=1) > 0` says which actors
+        love someone who hates them.
+        '''
+        if inverse is None:
+            inverse = relation
+        return self.matrix(relation).multiply(self.matrix(inverse).T).tocsr()
+
+    def paths(self, *relations):
+        ''' Boolean matrix of the pairs of actors connected by a path that
+        follows the given relations in order.
+
+        E.g. `paths("knows", "knows")` says who can reach whom in exactly two
+        steps of "knows".
+        '''
+        result = self.matrix(relations[0])
+        for relation in relations[1:]:
+            result = (result.astype(numpy.int64) @
+                      self.matrix(relation).astype(numpy.int64)) > 0
+        return result.tocsr()
+
+    def pairs(self, matrix):
+        ''' The (name, name) pairs where a matrix from this store is nonzero.
+        '''
+        names = self.actor_ids.names
+        rows, columns = matrix.nonzero()
+        return [(names[row], names[column])
+                for row, column in zip(rows.tolist(), columns.tolist())]
+
+    def layer(self):
+        return LayeredSparseRelationshipStore(self)
+
+    def flattened(self):
+        return SparseRelationshipStore(self, self.actor_ids)
+
+
+class SparseRelationshipStore(SparseQueries, RelationshipStore):
+    ''' A RelationshipStore that also keeps the (row, column) coordinates of
+    each relation's adjacency matrix, so it can answer SparseQueries.
+
+    The coordinates are updated along with the other indexes whenever a
+    triple is added or removed; each relation's matrix is built from them
+    when it is first asked for after a change.
+    '''
+
+    def __init__(self, triples=None, actor_ids=None):
+        ''' Create a new sparse relationship store.
+
+        Args:
+            triples: If not None, an iterable of (subject, relation, object)
+                     triples (or lists) to start with.
+            actor_ids: If not None, the ActorIds to use (e.g. those of
+                       another store); otherwise the store has its own.
+        '''
+        self.actor_ids = ActorIds() if actor_ids is None else actor_ids
+        self._coordinates_of = {}  # Relation -> {(row, column): None}
+        self._matrices = {}  # Relation -> cached adjacency matrix
+        super().__init__(triples)
+
+    def add(self, triple):
+        if not super().add(triple):
+            return False
+        subject, relation, obj = triple
+        coordinates = (self.actor_ids.add(subject), self.actor_ids.add(obj))
+        self._coordinates_of.setdefault(relation, {})[coordinates] = None
+        self._matrices.pop(relation, None)
+        return True
+
+    def remove(self, triple):
+        super().remove(triple)
+        subject, relation, obj = triple
+        coordinates = self._coordinates_of[relation]
+        del coordinates[(self.actor_ids.ids[subject],
+                         self.actor_ids.ids[obj])]
+        if not coordinates:
+            del self._coordinates_of[relation]
+        self._matrices.pop(relation, None)
+
+    def _coordinates(self, relation):
+        return self._coordinates_of.get(relation, ())
+
+
+class LayeredSparseRelationshipStore(SparseQueries, LayeredRelationshipStore):
+    ''' A LayeredRelationshipStore over a sparse store, which can answer
+    SparseQueries too.
+    '''
+
+    def __init__(self, base):
+        super().__init__(base)
+        self.actor_ids = base.actor_ids
+        self._matrices = {}
+
+    def add(self, triple):
+        if not super().add(triple):
+            return False
+        self.actor_ids.add(triple[0])
+        self.actor_ids.add(triple[2])
+        self._matrices.pop(triple[1], None)
+        return True
+
+    def remove(self, triple):
+        super().remove(triple)
+        self._matrices.pop(triple[1], None)
+
+    def _coordinates(self, relation):
+        ids = self.actor_ids.ids
+        removed = {(ids[subject], ids[obj])
+                   for subject, this_relation, obj in self._removed
+                   if this_relation == relation}
+        coordinates = [coordinates
+                       for coordinates in self._base._coordinates(relation)
+                       if coordinates not in removed]
+        coordinates += [(ids[subject], ids[obj])
+                        for subject, this_relation, obj in self._triples
+                        if this_relation == relation]
+        return coordinates
@@ -0,0 +1,181 @@
+'''
+Filtering whole populations of actors at once with NumPy.
+
+Only imported if NumPy is installed; see `Event.vector_filter`.
+'''
+
+import numpy
+
+# Smallest number of combinations worth filtering with NumPy; below this, the
+# overhead of building the arrays outweighs the time saved.
+MIN_VECTOR_SIZE = 64
+
+
+class ActorColumns:
+    ''' The actors that can fill one position of an event, with their
+    properties as NumPy arrays.
+
+    Reading any attribute that doesn't start with "_" (e.g. `a.location`)
+    gives an array of that property's value for every actor, shaped so that
+    arrays for different positions broadcast against each other over every
+    combination of actors: for a two-actor event, the first position's arrays
+    have shape (N, 1) and the second's (1, M). Values are stored as booleans,
+    integers, floats or strings if they all are, and as Python objects
+    otherwise (e.g. if some of them are None).
+    '''
+
+    def __init__(self, actors, position, n_positions):
+        self._actors = actors
+        self._position = position
+        self._shape = tuple(len(actors) if i == position else 1
+                            for i in range(n_positions))
+        self._arrays = {}
+        self._names = None
+
+    def __len__(self):
+        return len(self._actors)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        array = self._arrays.get(name)
+        if array is None:
+            array = column_array([getattr(actor, name)
+                                  for actor in self._actors])
+            array = self._arrays[name] = array.reshape(self._shape)
+        return array
+
+    def _name_positions(self):
+        ''' Dictionary of actor name -> position in this column.
+        '''
+        if self._names is None:
+            self._names = {actor.name: i
+                           for i, actor in enumerate(self._actors)}
+        return self._names
+
+
+def column_array(values):
+    ''' A one-dimensional array of the values, with a native dtype if they all
+    have the same simple type.
+    '''
+    types = set(map(type, values))
+    if len(types) == 1:
+        kind = types.pop()
+        if kind in (bool, int, float, str):
+            return numpy.array(values, dtype=kind)
+    array = numpy.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def related_mask(relationships, a, relation, b):
+    ''' Boolean array of which actors in column `a` have the relation to
+    which actors in column `b`, shaped to broadcast like their properties.
+    '''
+    shape = [1] * len(a._shape)
+    shape[a._position] = len(a)
+    shape[b._position] = len(b)
+    mask = numpy.zeros(shape, dtype=bool)
+    if hasattr(relationships, "matrix") and a._position != b._position:
+        # A sparse store (see smew.sparse): take the rows and columns for
+        # these actors out of the adjacency matrix.
+        rows = [relationships.actor_id(actor.name) for actor in a._actors]
+        columns = [relationships.actor_id(actor.name) for actor in b._actors]
+        a_known = [i for i, row in enumerate(rows) if row is not None]
+        b_known = [j for j, column in enumerate(columns) if column is not None]
+        if a_known and b_known:
+            matrix = relationships.matrix(relation)
+            block = matrix[[rows[i] for i in a_known]][
+                :, [columns[j] for j in b_known]].toarray()
+            if a._position > b._position:
+                block = block.T
+                a_known, b_known = b_known, a_known
+            first, second = sorted((a._position, b._position))
+            index = [0] * len(shape)
+            index[first] = numpy.array(a_known)[:, None]
+            index[second] = numpy.array(b_known)[None, :]
+            mask[tuple(index)] = block
+        return mask
+    index = [0] * len(shape)
+    targets = b._name_positions()
+    for i, actor in enumerate(a._actors):
+        index[a._position] = i
+        for name in relationships.objects(actor.name, relation):
+            j = targets.get(name)
+            if j is not None and (a._position != b._position or i == j):
+                index[b._position] = j
+                mask[tuple(index)] = True
+    return mask
+
+
+def vector_matching(probe, pools, joins):
+    ''' Find the combinations of distinct actors, one from each pool, that
+    pass an event's `vector_filter` and its `same` constraints.
+
+    Args:
+        probe: An instance of the Event class to call `vector_filter` on.
+        pools: List of the actors that can fill each position.
+        joins: The event's parsed `same` constraints (see
+               SmewModel._join_spec).
+
+    Returns:
+        An iterator of tuples of actors, in the same order as
+        itertools.product would generate them.
+    '''
+    return masked_combinations(pools, vector_mask(probe, pools, joins))
+
+
+def vector_mask(probe, pools, joins):
+    ''' Boolean array, with one dimension per pool, of which combinations of
+    actors pass (see vector_matching).
+    '''
+    n = len(pools)
+    columns = [ActorColumns(pool, i, n) for i, pool in enumerate(pools)]
+    shape = tuple(len(pool) for pool in pools)
+    mask = numpy.array(numpy.broadcast_to(
+        numpy.asarray(probe.vector_filter(*columns), dtype=bool), shape))
+    # Equal values (and the same actor) are compared as integer codes, which
+    # is much faster than comparing the values themselves.
+    for position, constraints in joins.items():
+        for prop, others in constraints:
+            for other in others:
+                if other > position:
+                    codes = {}
+                    mask &= (_encode(columns[position], prop, codes) ==
+                             _encode(columns[other], prop, codes))
+    for i in range(n):
+        for j in range(i + 1, n):
+            if pools[i] is pools[j]:
+                same_actor = (numpy.arange(len(pools[i])).reshape(
+                    columns[i]._shape) == numpy.arange(len(pools[j])).reshape(
+                    columns[j]._shape))
+            else:
+                codes = {}
+                same_actor = (_encode(columns[i], None, codes) ==
+                              _encode(columns[j], None, codes))
+            mask &= ~same_actor
+    return mask
+
+
+def masked_combinations(pools, mask):
+    ''' Iterator of the tuples of actors, one from each pool, where `mask` is
+    True, in the same order as itertools.product would generate them.
+    '''
+    indices = [index.tolist() for index in numpy.nonzero(mask)]
+    return (tuple(pool[k] for pool, k in zip(pools, index))
+            for index in zip(*indices))
+
+
+def _encode(column, prop, codes):
+    ''' Array of integer codes for a property of each actor in a column (or
+    for the actors themselves, if `prop` is None), shaped like its
+    properties. Values with the same code in `codes` get the same code.
+    '''
+    if prop is None:
+        values = column._actors
+    else:
+        values = [getattr(actor, prop) for actor in column._actors]
+    return numpy.fromiter((codes.setdefault(value, len(codes))
+                           for value in values),
+                          dtype=numpy.int64,
+                          count=len(values)).reshape(column._shape)
@@ -0,0 +1,63 @@
+import pytest
+
+from smew import Actor, SmewModel
+from smew.smew_model import SmewException
+
+
+def test_tags_are_read_only():
+    actor = Actor("Alice", ["person", "guest"])
+    assert actor.tags == ("person", "guest")
+    with pytest.raises(AttributeError):
+        actor.tags.append("vip")
+    actor.tags = ["vip"]
+    assert actor.tags == ("vip",)
+
+
+def test_get_tagged_follows_all_actors():
+    actors = [Actor(name, "person") for name in "ABCD"]
+    model = SmewModel(actors, verbose=False)
+    a, b, c, d = actors
+    a.remove_tag("person")
+    a.add_tag("person")
+    model.add_actor(Actor("E", "person"))
+    assert model.get_tagged("person") == model.all_actors
+
+
+def test_schema_rejects_reserved_names():
+    for reserved in ["name", "properties", "tags", "schema", "_model"]:
+        with pytest.raises(SmewException):
+            Actor.with_schema(["location", reserved])
+    with pytest.raises(SmewException):
+        Actor.with_schema(["location", "location"])
+
+
+def test_actor_can_only_be_in_one_model():
+    a, b = Actor("A", "person"), Actor("B", "person")
+    model = SmewModel([a, b], verbose=False)
+    with pytest.raises(SmewException):
+        SmewModel([Actor("C", "person"), b], verbose=False)
+    with pytest.raises(SmewException):
+        SmewModel(verbose=False).add_actor(a)
+    assert model.all_actors == [a, b]
+    model.remove_actor(a)
+    other = SmewModel(verbose=False)
+    other.add_actor(a)
+    a.add_tag("guest")
+    assert other.get_tagged("guest") == [a]
+    assert model.get_tagged("guest") == []
+
+
+def test_schema_actors_have_no_dictionary():
+    Guest = Actor.with_schema(["location"])
+    guest = Guest("A", "person", {"location": "hall"})
+    assert isinstance(guest, Actor)
+    assert not hasattr(guest, "__dict__")
+    model = SmewModel([guest], verbose=False)
+    with pytest.raises(AttributeError):
+        guest.mood = "happy"
+    model.begin()
+    guest.location = "garden"
+    guest.tags = ["ghost"]
+    model.rollback()
+    assert guest.location == "hall"
+    assert guest.tags == ("person",)
@@ -0,0 +1,87 @@
+import pytest
+
+from smew import Actor, Candidate, Event, SmewModel
+from benchmarks.worlds import ball_world, graph_world, rooms_world
+
+
+def worlds():
+    return [ball_world(40, 4), rooms_world(5, 8, 8), graph_world(30, 4)]
+
+
+def candidates(model):
+    return [str(candidate) for candidate in model.iter_candidates()]
+
+
+def test_candidate_order_survives_state_round_trip():
+    for world in worlds():
+        model = world.model()
+        model.generate(15, store_states=False)
+        copy = SmewModel.from_state(model.to_state(), world.events,
+                                    world.grammar, verbose=False)
+        assert candidates(copy) == candidates(model)
+
+
+def test_vectorized_matches_scalar():
+    pytest.importorskip("numpy")
+    for world in worlds():
+        vector = world.model(vectorized=True)
+        scalar = world.model(vectorized=False)
+        for _ in range(20):
+            assert candidates(vector) == candidates(scalar)
+            vector.advance()
+            scalar.advance()
+        assert vector.text_history == scalar.text_history
+
+
+def test_vectorized_profiling_counts():
+    pytest.importorskip("numpy")
+    world = ball_world(40, 4)
+    model = world.model()
+    profiler = model.start_profiling()
+    passed = len(candidates(model))
+    checked = sum(stats.filtered for stats in profiler.events.values())
+    assert checked > 0
+    assert sum(stats.passed for stats in profiler.events.values()) == passed
+
+
+def test_incremental_matches_full_enumeration():
+    for world in worlds():
+        full = world.model()
+        incremental = world.model(incremental=True)
+        for _ in range(25):
+            expected = sorted(candidates(full))
+            assert sorted(candidates(incremental)) == expected
+            if not expected:
+                break
+            # Run the same event in both models
+            chosen = min(full.iter_candidates(), key=str)
+            full.run_candidate(chosen)
+            incremental.run_candidate(Candidate(
+                chosen.event_class,
+                tuple(incremental.actors[actor.name]
+                      for actor in chosen.actors)))
+
+
+class Hello(Event):
+    def filter(self, a):
+        return True
+
+    def action(self, a):
+        self.narrate(_text=f"Hello, {a}.")
+
+    def __repr__(self):
+        return f"Hello to {self._actors[0]}"
+
+
+class Wave(Hello):
+    __repr__ = Event.__repr__
+
+    def __str__(self):
+        return f"Wave from {self._actors[0]}"
+
+
+def test_debug_advance_describes_events_their_own_way():
+    model = SmewModel([Actor("A", "p")], [Hello, Wave], verbose=False)
+    debug_data = model.debug_advance()
+    assert debug_data["possible_events"] == ["Hello to A", "Wave from A"]
+    assert debug_data["chosen_event"] in debug_data["possible_events"]
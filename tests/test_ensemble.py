@@ -0,0 +1,15 @@
+from smew import run_ensemble, run_one
+from benchmarks.worlds import ball_world
+
+
+def test_results_dont_depend_on_the_number_of_processes():
+    world = ball_world(12, 3)
+    args = (world.state, world.events, range(6), world.grammar, 20)
+    serial = list(run_ensemble(*args, processes=0))
+    parallel = list(run_ensemble(*args, processes=2, ordered=True))
+    assert parallel == serial
+    unordered = run_ensemble(*args, processes=2)
+    assert sorted(unordered) == serial
+    assert run_one(world.state, world.events, 4, world.grammar, 20) == \
+        serial[4]
+    assert len({tuple(result.events) for result in serial}) > 1
@@ -0,0 +1,28 @@
+from smew import Actor, Event, SmewModel
+
+
+class Hello(Event):
+    def filter(self, a):
+        return True
+
+    def action(self, a):
+        self.narrate(_text=f"Hello, {a}.")
+
+
+class Wave(Hello):
+    def __str__(self):
+        return f"Wave from {self._actors[0]}"
+
+
+class Bow(Hello):
+    def __repr__(self):
+        return f"Bow from {self._actors[0]}"
+
+
+def test_event_history_uses_the_event_description():
+    for event_class, description in [(Hello, "Hello(Actor(A, ['p']),)"),
+                                      (Wave, "Wave from A"),
+                                      (Bow, "Bow from A")]:
+        model = SmewModel([Actor("A", "p")], [event_class], verbose=False)
+        model.advance()
+        assert list(model.event_history) == [description]
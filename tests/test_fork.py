@@ -0,0 +1,85 @@
+import pytest
+
+from smew import Actor, SmewModel
+from benchmarks.worlds import ball_world
+
+
+def test_fork_runs_candidates_of_the_original():
+    world = ball_world(12, 3)
+    model = world.model()
+    state = model.to_state()
+    candidate = next(model.iter_candidates())
+    copy = model.fork()
+    copy.run_candidate(candidate)
+    assert model.to_state() == state
+    assert copy.to_state() != state
+    model.run_candidate(candidate)
+    assert model.to_state() == copy.to_state()
+
+
+def test_fork_and_original_are_independent():
+    actors = [Actor("Alice", "person", {"location": "hall"}),
+              Actor("Bob", ["person", "guest"], {"location": "garden"}),
+              Actor("Carol", "person", {"location": "hall"})]
+    model = SmewModel(actors, verbose=False, seed=0)
+    model.relate(actors[0], "knows", actors[1])
+    model.state_hash()
+    state = model.to_state()
+    copy = model.fork()
+
+    actors[0].location = "garden"
+    actors[1].add_tag("host")
+    model.remove_actor(actors[2])
+    model.add_actor(Actor("Dave", "person", {"location": "hall"}))
+    changed = model.to_state()
+    assert copy.to_state() == state
+    assert copy.get_tagged("host") == []
+    assert copy.state_hash() == SmewModel.from_state(state).state_hash()
+
+    copy.actors["Bob"].location = "cellar"
+    copy.remove_actor(copy.actors["Alice"])
+    assert model.to_state() == changed
+    assert model.state_hash() == SmewModel.from_state(changed).state_hash()
+    assert copy.state_hash() == \
+        SmewModel.from_state(copy.to_state()).state_hash()
+
+
+def test_fork_copies_actors_as_they_are_used():
+    model = ball_world(200, 10).model()
+    candidate = next(model.iter_candidates())
+    copy = model.fork()
+    copy.run_candidate(candidate)
+    assert len(copy._actor_table) <= len(candidate.actors)
+    model.run_candidate(candidate)
+    assert copy.to_state() == model.to_state()
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_fork_chain(incremental):
+    world = ball_world(20, 3)
+    reference = world.model(incremental=incremental, seed=3)
+    model = world.model(incremental=incremental, seed=3)
+    model.state_hash()
+    generations = [model]
+    for _ in range(2 * SmewModel.max_fork_depth + 3):
+        model = model.fork()
+        # Keep changing the earlier models, which mustn't affect their forks
+        for earlier in generations[-3:]:
+            earlier.advance()
+        generations.append(model)
+        model.advance()
+        reference.advance()
+        assert model.to_state() == reference.to_state()
+        assert ([str(c) for c in model.iter_candidates()] ==
+                [str(c) for c in reference.iter_candidates()])
+    assert model.state_hash() == reference.state_hash()
+
+
+def test_fork_has_its_own_grammar():
+    model = SmewModel([Actor("A", "person")], verbose=False,
+                      grammar={"mood": ["calm"]})
+    copy = model.fork()
+    copy.grammar["mood"] = ["tense"]
+    model.grammar["weather"] = ["rain"]
+    assert model.grammar == {"mood": ["calm"], "weather": ["rain"]}
+    assert copy.grammar == {"mood": ["tense"]}
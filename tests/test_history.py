@@ -0,0 +1,41 @@
+from smew import SmewModel, Sink
+from benchmarks.worlds import ball_world, rooms_world
+
+
+class StateSink(Sink):
+    states = True
+
+    def __init__(self):
+        self.states_by_step = {}
+
+    def write(self, record):
+        self.states_by_step[record.step + 1] = record.state
+
+
+def test_state_history_matches_to_state():
+    for world in [ball_world(12, 3), rooms_world(4, 4, 4)]:
+        model = world.model(checkpoint_every=4)
+        sink = StateSink()
+        model.generate(15, sinks=[sink])
+        for step, state in sink.states_by_step.items():
+            assert model.state_at(step) == state
+
+
+def test_changes_are_only_recorded_during_generate():
+    model = ball_world(12, 3).model()
+    model.generate(5)
+    for _ in model.iter_steps(20):
+        pass
+    assert model._changes is None
+    assert len(model.state_history) == 5
+
+
+def test_state_hash_matches_fresh_model():
+    world = ball_world(12, 3)
+    model = world.model()
+    model.state_hash()  # From now on, the hash is kept up to date
+    for _ in range(15):
+        model.advance()
+        fresh = SmewModel.from_state(model.to_state(), world.events,
+                                     verbose=False)
+        assert model.state_hash() == fresh.state_hash()
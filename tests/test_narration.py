@@ -0,0 +1,33 @@
+from smew import Actor, Event, SmewModel
+from benchmarks.worlds import ball_world
+
+
+class Greet(Event):
+    narrative = ["#greeting#, {a}."]
+
+    def filter(self, a):
+        return True
+
+    def action(self, a):
+        self.narrate(a=a)
+
+
+def test_in_place_grammar_changes_apply():
+    model = SmewModel([Actor("Alice", "person")], [Greet],
+                      {"greeting": ["Hello"]}, verbose=False)
+    model.advance()
+    model.grammar["greeting"] = ["Goodbye"]
+    model.advance()
+    model.grammar.update(greeting=["Welcome"])
+    model.advance()
+    assert list(model.text_history)[::2] == ["Hello, Alice.", "Goodbye, Alice.",
+                                             "Welcome, Alice."]
+
+
+def test_deferred_text_matches_eager_text():
+    world = ball_world(12, 3)
+    eager = world.model()
+    deferred = world.model(defer_narration=True)
+    eager.generate(20)
+    deferred.generate(20)
+    assert list(deferred.text_history) == list(eager.text_history)
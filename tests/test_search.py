@@ -0,0 +1,19 @@
+from smew import monte_carlo_search
+from benchmarks.worlds import ball_world
+
+
+def test_monte_carlo_search_stops_rollouts_when_budget_is_spent():
+    scored = []
+
+    def score(model):
+        scored.append(model.step)
+        return model.step
+
+    model = ball_world(30, 3).model()
+    result = monte_carlo_search(model, score, depth=5, rollouts=20,
+                                horizon=20, max_nodes=10, seed=0)
+    # One rollout of the first event uses up the budget; it's chosen, and
+    # then the final story is scored.
+    assert len(scored) == 2
+    assert len(result.events) == 1
+    assert model.step == 0
@@ -0,0 +1,23 @@
+import io
+
+import pytest
+
+from smew import Sink
+from smew.sinks import FileSink, TextSink
+from benchmarks.worlds import ball_world
+
+
+def test_sinks_must_implement_their_methods():
+    with pytest.raises(TypeError):
+        Sink()
+    with pytest.raises(TypeError):
+        FileSink(io.StringIO())
+
+
+def test_text_sink_writes_the_narration():
+    model = ball_world(12, 3).model()
+    out = io.StringIO()
+    with TextSink(out, buffer_size=4) as sink:
+        model.generate(10, store_states=False, sinks=[sink])
+    assert out.getvalue().splitlines() == [event.text
+                                           for event in model.event_log]
@@ -0,0 +1,126 @@
+import pytest
+
+pytest.importorskip("scipy")
+
+import numpy  # noqa: E402
+
+from smew import Actor, RelationshipStore, SmewModel  # noqa: E402
+from smew.sparse import SparseRelationshipStore  # noqa: E402
+from smew.vectorized import ActorColumns, related_mask  # noqa: E402
+from benchmarks.worlds import graph_world  # noqa: E402
+
+
+def check_queries(store):
+    ''' Check the sparse queries of a store against its triples.
+    '''
+    triples = set(store)
+    names = store.names
+    ids = {name: i for i, name in enumerate(names)}
+    for relation in {triple[1] for triple in triples} | {"missing"}:
+        expected = numpy.zeros((len(names), len(names)), dtype=bool)
+        for subject, this_relation, obj in triples:
+            if this_relation == relation:
+                expected[ids[subject], ids[obj]] = True
+        matrix = store.matrix(relation)
+        assert (matrix.toarray() == expected).all()
+        assert set(store.pairs(matrix)) == {
+            (subject, obj) for subject, this_relation, obj in triples
+            if this_relation == relation}
+        assert (store.in_degree(relation) == expected.sum(axis=0)).all()
+        assert (store.out_degree(relation) == expected.sum(axis=1)).all()
+        assert (store.mutual(relation).toarray() ==
+                (expected & expected.T)).all()
+
+
+def make_model():
+    actors = [Actor(name, "person") for name in "ABCDE"]
+    model = SmewModel(actors, verbose=False,
+                      relationship_store=SparseRelationshipStore)
+    a, b, c, d, e = actors
+    model.relate(a, "knows", b)
+    model.relate(b, "knows", c, False)
+    model.relate(c, "likes", a, False)
+    model.relate(d, "likes", e)
+    return model
+
+
+def test_sparse_queries_after_changes():
+    model = make_model()
+    check_queries(model.relationships)
+    a, b, c, d, e = model.all_actors
+    model.unrelate(a, "knows", b)
+    check_queries(model.relationships)
+    model.remove_actor(d)
+    check_queries(model.relationships)
+    model.relate(e, "knows", a)
+    check_queries(model.relationships)
+
+
+def test_sparse_queries_in_transactions():
+    model = make_model()
+    before = set(model.relationships)
+    a, b, c, d, e = model.all_actors
+    model.begin()
+    model.unrelate(a, "knows", b)
+    model.relate(e, "likes", c)
+    check_queries(model.relationships)
+    model.begin()
+    model.remove_actor(c)
+    check_queries(model.relationships)
+    model.commit()
+    check_queries(model.relationships)
+    model.rollback()
+    assert set(model.relationships) == before
+    check_queries(model.relationships)
+
+    model.begin()
+    model.relate(a, "likes", e, False)
+    model.commit()
+    check_queries(model.relationships)
+
+
+def test_sparse_queries_in_forks():
+    model = make_model()
+    copy = model.fork()
+    a, b, c, d, e = model.all_actors
+    model.unrelate(a, "knows", b)
+    model.relate(e, "likes", b, False)
+    copy.remove_actor(copy.actors["C"])
+    copy.relate(copy.actors["B"], "likes", copy.actors["D"])
+    check_queries(model.relationships)
+    check_queries(copy.relationships)
+    for _ in range(SmewModel.max_fork_depth + 2):
+        copy = copy.fork()
+        copy.unrelate(copy.actors["B"], "likes", copy.actors["D"])
+        copy.relate(copy.actors["B"], "likes", copy.actors["D"])
+    check_queries(copy.relationships)
+
+
+def test_sparse_related_mask_matches_plain_store():
+    world = graph_world(30, 4)
+    sparse = world.model(relationship_store=SparseRelationshipStore)
+    plain = world.model(vectorized=False)
+    for _ in range(30):
+        assert ([str(candidate) for candidate in sparse.iter_candidates()] ==
+                [str(candidate) for candidate in plain.iter_candidates()])
+        sparse.advance()
+        plain.advance()
+    check_queries(sparse.relationships)
+
+
+def test_sparse_related_mask_in_any_position():
+    model = make_model()
+    model.add_actor(Actor("F", "person"))  # In no relationships
+    model.begin()
+    a, b = model.all_actors[:2]
+    model.unrelate(a, "knows", b, reciprocal=False)
+    plain = RelationshipStore(model.relationships)
+    actors = model.all_actors
+    pools = [actors[:4], actors[2:]]
+    columns = [ActorColumns(pool, i, 2) for i, pool in enumerate(pools)]
+    for a, b in [(0, 1), (1, 0), (0, 0), (1, 1)]:
+        for relation in ["knows", "likes"]:
+            assert (related_mask(model.relationships, columns[a], relation,
+                                 columns[b]) ==
+                    related_mask(plain, columns[a], relation,
+                                 columns[b])).all()
@@ -0,0 +1,67 @@
+import pytest
+
+from smew import Actor, SmewModel
+from benchmarks.worlds import ball_world
+
+
+def make_model():
+    actors = [Actor("Alice", "person", {"location": "hall"}),
+              Actor("Bob", ["person", "guest"], {"location": "garden"})]
+    return SmewModel(actors, verbose=False, seed=0)
+
+
+def test_rollback_tag_assignment():
+    model = make_model()
+    bob = model.actors["Bob"]
+    model.begin()
+    bob.tags = ["ghost", "person"]
+    assert model.get_tagged("ghost") == [bob]
+    model.rollback()
+    assert bob.tags == ("person", "guest")
+    assert model.get_tagged("ghost") == []
+    assert model.get_tagged("guest") == [bob]
+
+
+def test_rollback_restores_actor_order():
+    actors = [Actor(name, "person") for name in "ABCD"]
+    model = SmewModel(actors, verbose=False)
+    model.begin()
+    model.remove_actor(actors[0])
+    model.rollback()
+    assert model.all_actors == actors
+    assert model.get_tagged("person") == actors
+
+
+def snapshot(model):
+    return (model.to_state(), model.state_hash(),
+            [str(candidate) for candidate in model.iter_candidates()],
+            list(model.text_history), model.step)
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_rollback_invariants(incremental):
+    world = ball_world(20, 3)
+    model = world.model(incremental=incremental)
+    reference = world.model(incremental=incremental)
+    model.generate(5)
+    reference.generate(5)
+    before = snapshot(model)
+
+    model.begin()
+    first, second = model.all_actors[0], model.all_actors[1]
+    model.remove_actor(first)
+    second.remove_tag("character")
+    second.add_tag("character")
+    second.location = "home"
+    model.add_actor(Actor("Zed", "character", {"location": "home"}))
+    model.generate(5)
+    model.begin()
+    model.generate(3)
+    model.commit()
+    model.rollback()
+
+    assert snapshot(model) == before
+    model.generate(10)
+    reference.generate(10)
+    assert model.text_history == reference.text_history
+    assert snapshot(model) == snapshot(reference)